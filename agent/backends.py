@@ -0,0 +1,429 @@
+# agent/backends.py
+#
+# Model / vector-store backends behind one small interface
+# - ModelBackend: the only calls the pipeline makes (embeddings, vector store
+#   creation + search, responses, streamed responses)
+# - OpenAIBackend: the OpenAI SDK (clients created lazily, on first use)
+# - OfflineBackend: deterministic local stand-in for load tests / profiling
+#     embeddings: hashed bag-of-words vectors (similar text -> similar vectors)
+#     vector stores: in-process LocalVectorIndex per policy
+#     responses: canned evaluator output per stage
+#     every call waits OFFLINE_LATENCY_MS first (0 = full speed)
+# - MODEL_BACKEND=openai|offline selects the process-wide backend
+#   (get_backend / set_backend)
+
+import os
+import json
+import time
+import zlib
+import asyncio
+import threading
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Protocol, Tuple
+
+import httpx
+import numpy as np
+from openai import OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient
+
+from agent.lexical_index import tokenize
+from agent.local_vector_store import LocalVectorIndex
+
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "openai").lower()
+
+# Async client connection pool (shared by every session of the backend)
+ASYNC_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "64"))
+ASYNC_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "32"))
+
+OFFLINE_LATENCY_MS = float(os.getenv("OFFLINE_LATENCY_MS", "0"))
+OFFLINE_STREAM_DELTA_MS = float(os.getenv("OFFLINE_STREAM_DELTA_MS", "0"))
+OFFLINE_EMBEDDING_DIM = 256
+
+
+class StreamFailed(RuntimeError):
+    """A streamed response failed, was cut short or reported an error."""
+
+
+class ModelBackend(Protocol):
+    name: str
+    # vector store ids outlive the process (safe to cache on disk)
+    durable_stores: bool
+
+    def model_id(self, model: str) -> str:
+        """Model name as used in cache keys (keeps backends' caches apart)."""
+
+    def embed(self, texts: List[str], model: str) -> Tuple[List[List[float]], Any]:
+        """(one vector per text, in input order; usage or None)"""
+
+    def create_vector_store(
+        self, name: str, pdf_path: str, chunks: Callable[[], List[str]]
+    ) -> str:
+        """New store over the policy; chunks() gives its text if the backend needs it."""
+
+    def search(self, vector_store_id: str, query: str, max_results: int) -> List[Tuple[float, str]]:
+        """[(score, text), ...] best first."""
+
+    async def asearch(
+        self, vector_store_id: str, query: str, max_results: int
+    ) -> List[Tuple[float, str]]:
+        ...
+
+    def respond(self, stage: str, model: str, prompt: str, **request) -> Tuple[str, Any]:
+        """(output text, usage or None); request: extra responses.create arguments."""
+
+    async def arespond(self, stage: str, model: str, prompt: str, **request) -> Tuple[str, Any]:
+        ...
+
+    def astream(self, stage: str, model: str, prompt: str) -> AsyncIterator[Tuple[Optional[str], Any]]:
+        """
+        (text delta, None) per delta, then (None, usage) once when the response
+        completed. Raises StreamFailed on failed / incomplete / error events.
+        """
+
+
+# --------------------------------------------------
+# OpenAI
+# --------------------------------------------------
+
+def _search_hits(results) -> List[Tuple[float, str]]:
+    return [
+        (float(item.score), item.content[0].text)
+        for item in results.data
+        if item.content
+    ]
+
+
+class OpenAIBackend:
+    name = "openai"
+    durable_stores = True
+
+    def __init__(self, api_key: Optional[str] = None):
+        self._api_key = api_key
+        self._client = None
+        self._aclient = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = OpenAI(api_key=self._api_key or os.getenv("OPENAI_API_KEY"))
+        return self._client
+
+    @property
+    def aclient(self):
+        """
+        One AsyncOpenAI client per process: shared connection pool + keep-alive.
+        Created lazily so it binds to the running event loop.
+        """
+        if self._aclient is None:
+            self._aclient = AsyncOpenAI(
+                api_key=self._api_key or os.getenv("OPENAI_API_KEY"),
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=ASYNC_MAX_CONNECTIONS,
+                        max_keepalive_connections=ASYNC_MAX_KEEPALIVE,
+                        keepalive_expiry=60,
+                    ),
+                ),
+            )
+        return self._aclient
+
+    def model_id(self, model: str) -> str:
+        return model
+
+    def embed(self, texts: List[str], model: str) -> Tuple[List[List[float]], Any]:
+        resp = self.client.embeddings.create(model=model, input=texts)
+        ordered = sorted(resp.data, key=lambda d: d.index)
+        return [d.embedding for d in ordered], getattr(resp, "usage", None)
+
+    def create_vector_store(
+        self, name: str, pdf_path: str, chunks: Callable[[], List[str]]
+    ) -> str:
+        vs = self.client.vector_stores.create(name=name)
+        with open(pdf_path, "rb") as f:
+            self.client.vector_stores.files.upload_and_poll(
+                vector_store_id=vs.id,
+                file=f,
+            )
+        return vs.id
+
+    def search(self, vector_store_id: str, query: str, max_results: int) -> List[Tuple[float, str]]:
+        return _search_hits(self.client.vector_stores.search(
+            vector_store_id=vector_store_id,
+            query=query,
+            max_num_results=max_results,
+        ))
+
+    async def asearch(
+        self, vector_store_id: str, query: str, max_results: int
+    ) -> List[Tuple[float, str]]:
+        return _search_hits(await self.aclient.vector_stores.search(
+            vector_store_id=vector_store_id,
+            query=query,
+            max_num_results=max_results,
+        ))
+
+    def respond(self, stage: str, model: str, prompt: str, **request) -> Tuple[str, Any]:
+        response = self.client.responses.create(
+            model=model,
+            input=prompt,
+            temperature=0,
+            **request,
+        )
+        return response.output_text, getattr(response, "usage", None)
+
+    async def arespond(self, stage: str, model: str, prompt: str, **request) -> Tuple[str, Any]:
+        response = await self.aclient.responses.create(
+            model=model,
+            input=prompt,
+            temperature=0,
+            **request,
+        )
+        return response.output_text, getattr(response, "usage", None)
+
+    async def astream(self, stage: str, model: str, prompt: str) -> AsyncIterator[Tuple[Optional[str], Any]]:
+        stream = await self.aclient.responses.create(
+            model=model,
+            input=prompt,
+            temperature=0,
+            stream=True,
+        )
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                yield event.delta, None
+            elif event.type == "response.completed":
+                yield None, getattr(event.response, "usage", None)
+            elif event.type == "response.failed":
+                error = getattr(event.response, "error", None)
+                raise StreamFailed(f"Response failed: {getattr(error, 'message', error)}")
+            elif event.type == "response.incomplete":
+                details = getattr(event.response, "incomplete_details", None)
+                raise StreamFailed(f"Response incomplete: {getattr(details, 'reason', details)}")
+            elif event.type == "error":
+                raise StreamFailed(f"Stream error: {getattr(event, 'message', event)}")
+
+
+# --------------------------------------------------
+# Offline stand-in
+# --------------------------------------------------
+
+SAMPLE_REPORT = """Decision: Violation
+
+A) Unauthorized disclosure of personal health information
+- Evidence:
+  - [Chunk 1] "A custodian shall not disclose personal health information without consent."
+- Children:
+  - A1) Incident fact: "The nurse shared the patient's chart with a visitor."
+       Why: The disclosure was made without the patient's consent.
+  - A2) Incident fact: "The chart was emailed to a personal account."
+       Why: Transmission outside the custodian's control is a disclosure.
+
+B) Failure to notify the affected individual
+- Evidence:
+  - [Chunk 2] "The custodian shall notify the individual at the first reasonable opportunity."
+- Children:
+  - B1) Incident fact: "The patient was not informed of the breach."
+       Why: No notification was given.
+
+Unmapped incident actions:
+- "The visitor left the ward." Not enough policy evidence.
+"""
+
+# Structured-output sample; must satisfy EVALUATION_SCHEMA (tests/test_backends.py)
+SAMPLE_STRUCTURED = {
+    "decision": "Violation",
+    "parents": [{
+        "title": "Unauthorized disclosure of personal health information",
+        "evidence": [{
+            "chunk": 1,
+            "quote": "A custodian shall not disclose personal health information without consent.",
+        }],
+        "additional_evidence": [],
+        "children": [{
+            "incident_fact": "The nurse shared the patient's chart with a visitor.",
+            "why": "The disclosure was made without the patient's consent.",
+        }],
+    }],
+    "unmapped_actions": [],
+    "reason": "",
+}
+
+
+def default_recordings() -> Dict:
+    return {
+        "evaluate": SAMPLE_REPORT,
+        "polish": SAMPLE_REPORT,
+        "augment": SAMPLE_REPORT,
+        "evaluate_structured": json.dumps(SAMPLE_STRUCTURED),
+    }
+
+
+def _usage(input_text: str, output_text: str = ""):
+    # ~4 characters per token, like the context packer's estimate
+    return SimpleNamespace(
+        input_tokens=len(input_text) // 4,
+        output_tokens=len(output_text) // 4,
+    )
+
+
+class OfflineBackend:
+    """
+    Deterministic, network-free backend.
+    - recordings: stage -> response text (default_recordings()); an optional
+      "search" entry ([[score, text], ...]) replaces in-process search
+    - calls: per-operation call counts
+    """
+
+    name = "offline"
+    durable_stores = False
+
+    def __init__(
+        self,
+        latency_ms: float = OFFLINE_LATENCY_MS,
+        recordings: Optional[Dict] = None,
+        stream_delta_ms: float = OFFLINE_STREAM_DELTA_MS,
+        dim: int = OFFLINE_EMBEDDING_DIM,
+    ):
+        self.latency = latency_ms / 1000
+        self.stream_delay = stream_delta_ms / 1000
+        self.recordings = recordings or default_recordings()
+        self.dim = dim
+        self.calls: Dict[str, int] = {}
+        self._stores: Dict[str, LocalVectorIndex] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _tick(self, name: str) -> None:
+        self._count(name)
+        if self.latency:
+            time.sleep(self.latency)
+
+    async def _atick(self, name: str) -> None:
+        self._count(name)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def model_id(self, model: str) -> str:
+        return f"offline-{model}"
+
+    def _vector(self, text: str) -> np.ndarray:
+        # hashing trick: each term adds +-1 to one of `dim` buckets
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for term in tokenize(text):
+            h = zlib.crc32(term.encode("utf-8"))
+            vec[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = float(np.linalg.norm(vec))
+        if norm == 0:
+            # no terms: a fixed pseudo-random direction per text
+            rng = np.random.RandomState(zlib.crc32(text.encode("utf-8")))
+            vec = rng.standard_normal(self.dim).astype(np.float32)
+            norm = float(np.linalg.norm(vec))
+        return vec / norm
+
+    def embed(self, texts: List[str], model: str) -> Tuple[List[List[float]], Any]:
+        self._tick("embeddings")
+        return [self._vector(t).tolist() for t in texts], _usage("".join(texts))
+
+    def create_vector_store(
+        self, name: str, pdf_path: str, chunks: Callable[[], List[str]]
+    ) -> str:
+        """
+        Memoized by name (one in-process index per policy); ids do not
+        survive a restart, hence durable_stores = False.
+        """
+        vs_id = f"offline_{name}"
+        with self._lock:
+            if vs_id in self._stores:
+                return vs_id
+        self._tick("vector_stores.create")
+        texts = chunks() or ["No policy text."]
+        matrix = np.stack([self._vector(t) for t in texts])
+        with self._lock:
+            self._stores.setdefault(vs_id, LocalVectorIndex(matrix, texts))
+        return vs_id
+
+    def _search(self, vector_store_id: str, query: str, max_results: int) -> List[Tuple[float, str]]:
+        hits = self.recordings.get("search")
+        if hits is not None:
+            return [(float(score), text) for score, text in hits[:max_results]]
+        index = self._stores.get(vector_store_id)
+        if index is None:
+            raise RuntimeError(f"Offline vector store not found: {vector_store_id}")
+        return index.search([self._vector(query)], max_results)[0]
+
+    def search(self, vector_store_id: str, query: str, max_results: int) -> List[Tuple[float, str]]:
+        self._tick("search")
+        return self._search(vector_store_id, query, max_results)
+
+    async def asearch(
+        self, vector_store_id: str, query: str, max_results: int
+    ) -> List[Tuple[float, str]]:
+        await self._atick("search")
+        return self._search(vector_store_id, query, max_results)
+
+    def _canned(self, stage: str) -> str:
+        return self.recordings.get(stage, self.recordings.get("evaluate", SAMPLE_REPORT))
+
+    def respond(self, stage: str, model: str, prompt: str, **request) -> Tuple[str, Any]:
+        self._tick("responses")
+        text = self._canned(stage)
+        return text, _usage(prompt, text)
+
+    async def arespond(self, stage: str, model: str, prompt: str, **request) -> Tuple[str, Any]:
+        await self._atick("responses")
+        text = self._canned(stage)
+        return text, _usage(prompt, text)
+
+    async def astream(self, stage: str, model: str, prompt: str) -> AsyncIterator[Tuple[Optional[str], Any]]:
+        await self._atick("responses")
+        text = self._canned(stage)
+        # word-sized deltas, like a token stream
+        start = 0
+        while start < len(text):
+            end = text.find(" ", start + 1)
+            end = len(text) if end < 0 else end
+            if self.stream_delay:
+                await asyncio.sleep(self.stream_delay)
+            yield text[start:end], None
+            start = end
+        yield None, _usage(prompt, text)
+
+
+# --------------------------------------------------
+# Process-wide backend
+# --------------------------------------------------
+
+_backend: Optional[ModelBackend] = None
+_backend_lock = threading.Lock()
+
+
+def make_backend(name: str) -> ModelBackend:
+    if name == "openai":
+        return OpenAIBackend()
+    if name == "offline":
+        return OfflineBackend()
+    raise ValueError(f"Unknown MODEL_BACKEND: {name!r} (expected 'openai' or 'offline').")
+
+
+def get_backend() -> ModelBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = make_backend(MODEL_BACKEND)
+    return _backend
+
+
+def set_backend(backend: Optional[ModelBackend]) -> Optional[ModelBackend]:
+    """
+    Swap the process-wide backend (bench / load tests). Returns the old one;
+    None goes back to MODEL_BACKEND on next use.
+    """
+    global _backend
+    with _backend_lock:
+        old, _backend = _backend, backend
+    return old
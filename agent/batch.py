@@ -0,0 +1,204 @@
+# agent/batch.py
+#
+# Bulk incident analysis against one policy
+#   python -m agent.batch files/policy3.pdf "files/incidents/*.pdf" -o results.jsonl
+# - One vector store for the whole run (and every on-disk cache)
+# - Incidents processed on a bounded thread pool (work is API-bound)
+# - Rate limits: a 429 pauses ALL workers until the server's retry-after,
+#   then the incident is retried with exponential backoff
+# - Results are appended to JSONL as each incident finishes; re-running with
+#   the same output file skips incidents already recorded as "ok"
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set, Tuple
+
+import openai
+
+from agent.embedding_store import (
+    analyze_incident,
+    get_or_create_vector_store,
+    parse_decision,
+    sha256_file,
+    RETRIEVAL_CONCURRENCY,
+)
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_MAX_RETRIES", "5"))
+BATCH_BACKOFF_SECONDS = float(os.getenv("BATCH_BACKOFF_SECONDS", "2"))
+
+
+class RateLimitGate:
+    """
+    Shared pause point: after a 429 every worker waits until resume_at.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def wait(self) -> None:
+        while True:
+            with self._lock:
+                delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+def _retry_after(err: openai.RateLimitError) -> Optional[float]:
+    headers = getattr(getattr(err, "response", None), "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def expand_incidents(patterns: List[str]) -> List[str]:
+    """
+    Directories (-> *.pdf inside), globs and plain paths; de-duplicated, sorted.
+    """
+    paths: List[str] = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(glob.glob(os.path.join(pattern, "*.pdf")))
+        else:
+            paths.extend(glob.glob(pattern) or [pattern])
+    return sorted(dict.fromkeys(p for p in paths if os.path.isfile(p)))
+
+
+def load_done(out_path: str, policy_hash: str) -> Set[str]:
+    """
+    Incident hashes already analyzed successfully against this policy.
+    A truncated last line (interrupted write) is ignored.
+    """
+    done: Set[str] = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if row.get("status") == "ok" and row.get("policy_hash") == policy_hash:
+                done.add(row.get("incident_hash"))
+    return done
+
+
+def analyze_one(
+    vs_id: str,
+    path: str,
+    incident_hash: str,
+    gate: RateLimitGate,
+    max_concurrency: int,
+    max_retries: int = BATCH_MAX_RETRIES,
+) -> Dict:
+    started = time.perf_counter()
+    for attempt in range(1, max_retries + 2):
+        gate.wait()
+        try:
+            _, chunks, report = analyze_incident(
+                vs_id, path, file_hash=incident_hash, max_concurrency=max_concurrency
+            )
+        except openai.RateLimitError as e:
+            if attempt > max_retries:
+                raise
+            delay = _retry_after(e) or BATCH_BACKOFF_SECONDS * 2 ** (attempt - 1)
+            print(f"[batch] Rate limited on {path}; pausing workers {delay:.1f}s.")
+            gate.pause(delay)
+            continue
+        return {
+            "status": "ok",
+            "decision": parse_decision(report),
+            "report": report,
+            "chunks": [{"score": round(float(s), 4), "chunk": c} for s, c in chunks],
+            "attempts": attempt,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+    raise RuntimeError("unreachable")
+
+
+def run_batch(
+    policy_pdf: str,
+    incident_patterns: List[str],
+    out_path: str,
+    workers: int = BATCH_WORKERS,
+) -> Tuple[int, int, int]:
+    """
+    Analyze every incident against policy_pdf, appending one JSON line each.
+    Returns (ok, failed, skipped).
+    """
+    incidents = expand_incidents(incident_patterns)
+    policy_hash = sha256_file(policy_pdf)
+    vs_id = get_or_create_vector_store(policy_pdf, file_hash=policy_hash)
+
+    done = load_done(out_path, policy_hash)
+    todo = []
+    for path in incidents:
+        h = sha256_file(path)
+        if h not in done:
+            todo.append((path, h))
+            done.add(h)  # same content under two names: analyze once
+    skipped = len(incidents) - len(todo)
+    print(
+        f"[batch] {len(incidents)} incidents, {skipped} already done "
+        f"(or duplicate content), {len(todo)} to run."
+    )
+
+    workers = max(1, min(workers, len(todo) or 1))
+    # split the per-analysis search fan-out between workers
+    per_analysis = max(1, RETRIEVAL_CONCURRENCY // workers)
+    gate = RateLimitGate()
+
+    ok = failed = 0
+    with open(out_path, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(analyze_one, vs_id, path, h, gate, per_analysis): (path, h)
+            for path, h in todo
+        }
+        for fut in as_completed(futures):
+            path, h = futures[fut]
+            row = {"incident": path, "incident_hash": h, "policy_hash": policy_hash}
+            try:
+                row.update(fut.result())
+                ok += 1
+            except Exception as e:
+                row.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+                failed += 1
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            out.flush()
+            print(f"[batch] {row['status']:5} {row.get('decision', '')} {path}")
+
+    print(f"[batch] Done: {ok} ok, {failed} failed, {skipped} skipped -> {out_path}")
+    return ok, failed, skipped
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Evaluate many incident PDFs against one policy PDF."
+    )
+    parser.add_argument("policy", help="policy PDF")
+    parser.add_argument("incidents", nargs="+", help="incident PDFs, directories or globs")
+    parser.add_argument("-o", "--out", default="batch_results.jsonl", help="JSONL results file (appended)")
+    parser.add_argument("-w", "--workers", type=int, default=BATCH_WORKERS)
+    args = parser.parse_args(argv)
+
+    _, failed, _ = run_batch(args.policy, args.incidents, args.out, workers=args.workers)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+# agent/bench.py
+#
+# Per-stage micro-benchmarks over a given policy / incident corpus
+#   python -m agent.bench --policy p.pdf --incident i.pdf --out bench.json
+#   python -m agent.bench --manifest bench_corpus.json --baseline bench.json
+# - Corpus roles are explicit (--policy / --incident, repeatable, or a
+#   manifest {"policies": [...], "incidents": [...]}, paths relative to it);
+#   upload names (<sha256>.pdf) say nothing about what a file is
+# - No network: runs on the OfflineBackend (agent/backends.py), which answers
+#   from recorded responses (--recordings, or built-in samples) after a
+#   configurable latency
+# - Runs inside a scratch directory, so cache/ (documents, embeddings, LLM
+#   responses) starts empty and the repo's caches are untouched
+# - Emits JSON: {"meta": {...}, "stages": {name: {runs, min_ms, median_ms, ...}}}
+# - --baseline compares against an earlier JSON and exits 1 on regressions
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+from typing import Callable, Dict, List, Optional, Tuple
+
+import agent.embedding_store as es
+from agent.backends import OfflineBackend, default_recordings, set_backend
+from agent.segmentation import get_segmenter
+from agent.report_format import parse_report, group_violations_locally
+
+BENCH_REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+BENCH_LATENCY_MS = float(os.getenv("BENCH_LATENCY_MS", "0"))
+
+# Stages faster than this (baseline median) are timer noise; not compared
+BENCH_NOISE_FLOOR_MS = 0.05
+
+
+# --------------------------------------------------
+# Timing
+# --------------------------------------------------
+
+def time_stage(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - started) * 1000)
+    return {
+        "runs": repeat,
+        "min_ms": round(min(runs), 4),
+        "median_ms": round(statistics.median(runs), 4),
+        "mean_ms": round(statistics.fmean(runs), 4),
+        "max_ms": round(max(runs), 4),
+    }
+
+
+def load_manifest(path: str) -> Tuple[List[str], List[str]]:
+    """
+    (policy paths, incident paths) from a manifest JSON
+    {"policies": [...], "incidents": [...]}; relative paths are resolved
+    against the manifest's directory.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+
+    def resolve(key: str) -> List[str]:
+        return [os.path.join(base, p) for p in data.get(key, [])]
+
+    return resolve("policies"), resolve("incidents")
+
+
+def find_corpus(policy_pdfs: List[str], incident_pdfs: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    (policy PDFs, incident PDFs) as absolute paths, one per distinct content.
+    Raises FileNotFoundError for a missing file.
+    """
+    def distinct(paths: List[str]) -> List[str]:
+        seen: Dict[str, str] = {}
+        for path in paths:
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"[bench] No such PDF: {path}")
+            seen.setdefault(es.sha256_file(path), os.path.abspath(path))
+        return list(seen.values())
+
+    return distinct(policy_pdfs), distinct(incident_pdfs)
+
+
+# --------------------------------------------------
+# Suite
+# --------------------------------------------------
+
+def run_suite(
+    policy_pdfs: List[str],
+    incident_pdfs: List[str],
+    repeat: int = BENCH_REPEAT,
+    latency_ms: float = BENCH_LATENCY_MS,
+    recordings: Optional[Dict] = None,
+) -> Dict:
+    policies, incidents = find_corpus(policy_pdfs, incident_pdfs)
+    if not policies or not incidents:
+        raise SystemExit("[bench] Need at least one policy and one incident PDF.")
+    policy_pdf, incident_pdf = policies[0], incidents[0]
+
+    stages: Dict[str, Dict] = {}
+
+    def bench(name: str, fn: Callable[[], object], items: int = 1, n: int = repeat) -> None:
+        stages[name] = dict(time_stage(fn, n), items=items)
+        print(f"[bench] {name:32} median {stages[name]['median_ms']:10.3f} ms")
+
+    # ---- extraction / text ----
+    all_pdfs = policies + incidents
+    raw = {p: es.read_pdf_text(p, parallel=False) for p in all_pdfs}
+    bench("read_pdf_text", lambda: [es.read_pdf_text(p, parallel=False) for p in all_pdfs], len(all_pdfs))
+    bench("normalize_text", lambda: [es.normalize_text(t) for t in raw.values()], len(raw))
+
+    policy_text = es.normalize_text(raw[policy_pdf])
+    incident_text = es.normalize_text(raw[incident_pdf])
+
+    seg = get_segmenter()
+    if seg.mode == "punkt":
+        seg.load()   # regex mode needs no model (and no nltk download)
+    bench("segment_sentences", lambda: [seg.span_tokenize(es.normalize_text(t)) for t in raw.values()], len(raw))
+
+    incident_spans = seg.span_tokenize(incident_text)
+    policy_spans = seg.span_tokenize(policy_text)
+    bench(
+        "sentence_chunks_adaptive",
+        lambda: es.sentence_chunks_adaptive(incident_text, sentence_spans=incident_spans),
+    )
+    bench(
+        "policy_sentence_windows",
+        lambda: es.policy_sentence_windows(policy_text, sentence_spans=policy_spans),
+    )
+
+    # ---- retrieval (offline backend: in-process search) ----
+    corpus = es.policy_sentence_windows(policy_text, sentence_spans=policy_spans)
+    backend = OfflineBackend(latency_ms=latency_ms, recordings=recordings or default_recordings())
+    set_backend(backend)
+    vs_id = backend.create_vector_store("bench", policy_pdf, lambda: corpus)
+
+    queries = es.sentence_chunks_adaptive(incident_text, sentence_spans=incident_spans)
+    per_query = es._search_queries(vs_id, queries, per_query_k=6, max_concurrency=1)
+    bench("merge_results", lambda: es._merge_results(per_query, top_k=25), sum(map(len, per_query)))
+    bench(
+        "retrieve_top_chunks",
+        lambda: es.retrieve_top_chunks(
+            vs_id, incident_text, top_k=25, sentence_spans=incident_spans
+        ),
+        len(queries),
+    )
+    retrieved = es._merge_results(per_query, top_k=25)
+    bench("pack_context", lambda: es.pack_context(retrieved), len(retrieved))
+    evidence = es.pack_context(retrieved)
+
+    # ---- prompts ----
+    bench("build_evaluation_prompt", lambda: es.build_evaluation_prompt(evidence, incident_text))
+    bench(
+        "build_structured_evaluation_prompt",
+        lambda: es.build_structured_evaluation_prompt(evidence, incident_text),
+    )
+    report = backend.recordings["evaluate"]
+    bench("build_polish_prompt", lambda: es.build_polish_prompt(report))
+
+    # ---- model calls (replayed, response cache bypassed) ----
+    bench(
+        "evaluate_incident_replayed",
+        lambda: es._complete(
+            "evaluate", es.build_evaluation_prompt(evidence, incident_text), bypass_cache=True
+        ),
+    )
+
+    # ---- parsing ----
+    bench("parse_decision", lambda: es.parse_decision(report))
+    bench("parse_report", lambda: parse_report(report))
+    bench("group_violations_locally", lambda: group_violations_locally(report))
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+            "latency_ms": latency_ms,
+            "policy_pdf": os.path.basename(policy_pdf),
+            "incident_pdf": os.path.basename(incident_pdf),
+            "pdfs": len(all_pdfs),
+            "replayed_calls": backend.calls,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "stages": stages,
+    }
+
+
+def compare(
+    result: Dict,
+    baseline: Dict,
+    max_regression: float,
+    noise_floor_ms: float = BENCH_NOISE_FLOOR_MS,
+) -> List[str]:
+    """
+    Stages whose median got slower than max_regression x the baseline median.
+    Adds baseline_median_ms / ratio to each compared stage.
+    """
+    regressions = []
+    for name, stage in result["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if not old or old.get("median_ms", 0) < noise_floor_ms:
+            continue
+        ratio = stage["median_ms"] / old["median_ms"]
+        stage["baseline_median_ms"] = old["median_ms"]
+        stage["ratio"] = round(ratio, 3)
+        if ratio > max_regression:
+            regressions.append(f"{name}: {old['median_ms']:.3f} -> {stage['median_ms']:.3f} ms (x{ratio:.2f})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Per-stage pipeline benchmarks (no network).")
+    parser.add_argument("--policy", action="append", default=[], help="policy PDF (repeatable)")
+    parser.add_argument("--incident", action="append", default=[], help="incident PDF (repeatable)")
+    parser.add_argument("--manifest", help='JSON {"policies": [...], "incidents": [...]}')
+    parser.add_argument("--repeat", type=int, default=BENCH_REPEAT)
+    parser.add_argument("--latency-ms", type=float, default=BENCH_LATENCY_MS, help="replayed API latency")
+    parser.add_argument("--recordings", help="JSON with recorded evaluate/polish/evaluate_structured/search responses")
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    policy_pdfs = [os.path.abspath(p) for p in args.policy]
+    incident_pdfs = [os.path.abspath(p) for p in args.incident]
+    if args.manifest:
+        manifest_policies, manifest_incidents = load_manifest(args.manifest)
+        policy_pdfs += manifest_policies
+        incident_pdfs += manifest_incidents
+    if not policy_pdfs or not incident_pdfs:
+        parser.error("give at least one --policy and one --incident (or a --manifest)")
+    recordings = None
+    if args.recordings:
+        with open(args.recordings, "r", encoding="utf-8") as f:
+            recordings = dict(default_recordings(), **json.load(f))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    out_path = os.path.abspath(args.out) if args.out else None
+
+    # scratch working directory: every cache/ path starts empty
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="bench_")
+    os.chdir(scratch)
+    try:
+        result = run_suite(
+            policy_pdfs, incident_pdfs,
+            repeat=args.repeat, latency_ms=args.latency_ms, recordings=recordings,
+        )
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    regressions = compare(result, baseline, args.max_regression) if baseline else []
+    text = json.dumps(result, indent=2)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"[bench] Wrote {out_path}")
+    else:
+        print(text)
+
+    for line in regressions:
+        print(f"[bench] REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+# agent/context_packer.py
+#
+# Token-budgeted packing of retrieved policy chunks for the evaluator prompt
+# - Local token estimate (no tokenizer download, no API call)
+# - Overlapping sentence windows from the same policy region collapse into
+#   one excerpt (suffix/prefix sentence overlap, or containment)
+# - Greedy by score: keep whole excerpts while they fit, trim the next one at a
+#   sentence boundary, drop the rest
+# - Output order is score order, so [Chunk N] numbering is deterministic
+# - Several policies: overlaps collapse within one policy only, and every
+#   excerpt is prefixed with its policy label before packing into one budget
+
+import os
+import re
+import math
+from typing import Dict, List, Tuple
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+
+# ~4 characters per token for English prose (OpenAI rule of thumb)
+CHARS_PER_TOKEN = 4.0
+
+# Don't bother trimming an excerpt into less than this many tokens
+MIN_TRIM_TOKENS = 60
+
+_SENT_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return int(math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def _sentences(text: str) -> List[str]:
+    return [s for s in _SENT_SPLIT_RE.split(text.strip()) if s]
+
+
+def _overlap_merge(a: List[str], b: List[str]) -> List[str]:
+    """
+    If b continues a (a's last k sentences == b's first k), return the union.
+    Returns [] when they don't overlap.
+    """
+    for k in range(min(len(a), len(b)), 0, -1):
+        if a[-k:] == b[:k]:
+            return a + b[k:]
+    return []
+
+
+def collapse_overlaps(chunks: List[Tuple[float, str]]) -> List[Tuple[float, str]]:
+    """
+    Merge chunks that are overlapping windows of the same passage.
+    The merged excerpt keeps the best score and the better-ranked position.
+    """
+    items = [(score, _sentences(text)) for score, text in chunks]
+
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(items)):
+            for j in range(len(items)):
+                if i == j:
+                    continue
+                si, ti = items[i]
+                sj, tj = items[j]
+                ji, jj = " ".join(ti), " ".join(tj)
+                if jj in ji:
+                    union = ti
+                else:
+                    union = _overlap_merge(ti, tj)
+                if not union:
+                    continue
+                keep, drop = (i, j) if i < j else (j, i)
+                items[keep] = (max(si, sj), union)
+                del items[drop]
+                merged = True
+                break
+            if merged:
+                break
+
+    return [(score, " ".join(sents)) for score, sents in items]
+
+
+def pack_context(
+    chunks: List[Tuple[float, str]],
+    budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+) -> List[Tuple[float, str]]:
+    """
+    Fit ranked chunks into budget_tokens (estimated) for the evaluator prompt.
+    Input/output: [(score, text), ...], best first.
+    """
+    ranked = sorted(
+        enumerate(collapse_overlaps(chunks)),
+        key=lambda x: (-x[1][0], x[0]),
+    )
+
+    packed: List[Tuple[float, str]] = []
+    remaining = budget_tokens
+    for _, (score, text) in ranked:
+        cost = estimate_tokens(text) + 4  # "[Chunk N]" header + separators
+        if cost <= remaining:
+            packed.append((score, text))
+            remaining -= cost
+            continue
+
+        if remaining >= MIN_TRIM_TOKENS:
+            kept: List[str] = []
+            used = 4
+            for sent in _sentences(text):
+                t = estimate_tokens(sent) + 1
+                if used + t > remaining:
+                    break
+                kept.append(sent)
+                used += t
+            if kept:
+                packed.append((score, " ".join(kept)))
+        break
+
+    return packed
+
+
+def tag_policy(label: str, text: str) -> str:
+    return f"(Policy: {label}) {text}"
+
+
+def rank_policy_evidence(
+    per_policy: List[Tuple[str, List[Tuple[float, str]]]],
+) -> Tuple[List[Tuple[float, str]], List[Dict[int, int]]]:
+    """
+    MULTI_POLICY_MODE=per_policy: every policy's (already packed) excerpts in
+    one list, best score first, tagged "(Policy: <label>)".
+    Also returns, per policy, {its [Chunk N]: position in that list} so the
+    combined report can cite the list the UI shows (combine_policy_reports).
+    """
+    ranked = sorted(
+        (
+            (score, p_idx, c_idx)
+            for p_idx, (_, chunks) in enumerate(per_policy)
+            for c_idx, (score, _) in enumerate(chunks, 1)
+        ),
+        key=lambda x: x[0],
+        reverse=True,
+    )
+    evidence: List[Tuple[float, str]] = []
+    numbers: List[Dict[int, int]] = [{} for _ in per_policy]
+    for rank, (score, p_idx, c_idx) in enumerate(ranked, 1):
+        label, chunks = per_policy[p_idx]
+        evidence.append((score, tag_policy(label, chunks[c_idx - 1][1])))
+        numbers[p_idx][c_idx] = rank
+    return evidence, numbers
+
+
+def pack_policy_context(
+    per_policy: List[Tuple[str, List[Tuple[float, str]]]],
+    budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+) -> List[Tuple[float, str]]:
+    """
+    One merged evidence set for several policies.
+    Input: [(policy_label, [(score, text), ...]), ...]; output as pack_context,
+    with each excerpt tagged "(Policy: <label>) ...".
+    """
+    tagged: List[Tuple[float, str]] = []
+    for label, chunks in per_policy:
+        tagged.extend(
+            (score, tag_policy(label, text)) for score, text in collapse_overlaps(chunks)
+        )
+    return pack_context(tagged, budget_tokens)
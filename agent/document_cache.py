@@ -0,0 +1,57 @@
+# agent/document_cache.py
+#
+# Parsed-document cache (skip PdfReader + normalize + sentence split on repeats)
+# - Key = file SHA-256 + extractor version (incl. the segmenter mode)
+# - Value = normalized text + sentence boundaries as flat [start, end, ...] offsets
+# - One small JSON file per document under cache/documents/
+
+import os
+import json
+import threading
+from dataclasses import dataclass
+from typing import List, Tuple, Optional
+
+CACHE_DIR = "cache"
+DOCUMENT_CACHE_DIR = os.path.join(CACHE_DIR, "documents")
+
+
+@dataclass
+class ParsedDocument:
+    """
+    Normalized document text plus sentence (start, end) offsets into it.
+    """
+    text: str
+    sentence_spans: List[Tuple[int, int]]
+
+    @property
+    def sentences(self) -> List[str]:
+        return [self.text[s:e] for s, e in self.sentence_spans]
+
+
+def _doc_path(file_hash: str, version: str) -> str:
+    return os.path.join(DOCUMENT_CACHE_DIR, f"{file_hash}_v{version}.json")
+
+
+def load_cached_document(file_hash: str, version: str) -> Optional[ParsedDocument]:
+    path = _doc_path(file_hash, version)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    flat = data.get("spans", [])
+    spans = list(zip(flat[0::2], flat[1::2]))
+    return ParsedDocument(text=data["text"], sentence_spans=spans)
+
+
+def save_cached_document(file_hash: str, version: str, doc: ParsedDocument) -> None:
+    os.makedirs(DOCUMENT_CACHE_DIR, exist_ok=True)
+    path = _doc_path(file_hash, version)
+    flat = [offset for span in doc.sentence_spans for offset in span]
+    # unique per thread too: aload_document saves from the shared CPU pool
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"text": doc.text, "spans": flat}, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
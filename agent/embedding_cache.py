@@ -0,0 +1,146 @@
+# agent/embedding_cache.py
+#
+# Persistent query-embedding cache (SQLite, stdlib only)
+# - Key = sha256(embedding_model + normalized chunk text)
+# - Value = float32 vector bytes
+# - LRU eviction by last_used once max_entries is exceeded
+# - Re-running the same incident (or overlapping windows) costs no API call
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import List, Dict, Optional
+
+CACHE_DIR = "cache"
+EMBEDDING_CACHE_FILE = os.path.join(CACHE_DIR, "query_embeddings.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+
+_lock = threading.Lock()
+# one connection per (thread, path); the schema is created once per path
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def embedding_key(text: str, model: str) -> str:
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS embeddings ("
+        " key TEXT PRIMARY KEY,"
+        " model TEXT NOT NULL,"
+        " vector BLOB NOT NULL,"
+        " last_used REAL NOT NULL)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)"
+    )
+    conn.commit()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """
+    This thread's connection to path (opened once, then reused).
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is not None:
+        return conn
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    with _schema_lock:
+        if path not in _schema_ready:
+            _create_schema(conn)
+            _schema_ready.add(path)
+    conns[path] = conn
+    return conn
+
+
+class EmbeddingCache:
+    """
+    Small LRU cache of embedding vectors on disk.
+    Safe to share across threads (per-thread connections, writes guarded by a lock).
+    """
+
+    def __init__(
+        self,
+        path: str = EMBEDDING_CACHE_FILE,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        if not keys:
+            return {}
+        found: Dict[str, List[float]] = {}
+        with _lock:
+            conn = _connect(self.path)
+            with conn:
+                unique = list(dict.fromkeys(keys))
+                for start in range(0, len(unique), 500):
+                    batch = unique[start:start + 500]
+                    marks = ",".join("?" * len(batch))
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({marks})",
+                        batch,
+                    ).fetchall()
+                    for key, blob in rows:
+                        vec = array("f")
+                        vec.frombytes(blob)
+                        found[key] = vec.tolist()
+                if found:
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, k) for k in found],
+                    )
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with _lock:
+            conn = _connect(self.path)
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used)"
+                    " VALUES (?, ?, ?, ?)",
+                    [
+                        (key, model, array("f", vec).tobytes(), now)
+                        for key, vec in items.items()
+                    ],
+                )
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+
+
+_default_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EmbeddingCache()
+    return _default_cache
@@ -21,77 +21,142 @@ import os
 import json
 import hashlib
 import re
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, AsyncIterator, Union
 import math
+import bisect
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from openai import OpenAI
+import asyncio
+import contextvars
 from PyPDF2 import PdfReader
-import nltk
+
+from agent.backends import StreamFailed, get_backend
+from agent.lexical_index import load_bm25_index, save_bm25_index
+from agent.local_vector_store import (
+    load_local_index,
+    save_local_index,
+    load_legacy_embeddings,
+)
+from agent.segmentation import get_segmenter
+from agent.text_normalize import normalize_text, normalize_chunk
+from agent.pdf_extract import extract_pages_parallel, PARALLEL_PAGE_THRESHOLD
+from agent import vector_store_cache
+from agent.context_packer import pack_context, pack_policy_context, rank_policy_evidence
+from agent.near_dup import suppress_near_duplicates, NEAR_DUP_THRESHOLD
+from agent.report_format import (
+    EvaluationReport,
+    EVALUATION_FORMAT,
+    combine_policy_reports,
+    group_violations_locally,
+    group_parents,
+    report_from_json,
+    render_report,
+)
+from agent.response_cache import get_response_cache, response_key
+from agent.embedding_cache import get_embedding_cache, embedding_key
+from agent.tracing import Trace, tag, record_cache, record_usage
+from agent.document_cache import (
+    ParsedDocument,
+    load_cached_document,
+    save_cached_document,
+)
 MAX_QUERY_CHARS = 4096
 # --------------------------------------------------
 # Setup
 # --------------------------------------------------
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Model / vector store calls go through get_backend() (MODEL_BACKEND=openai|offline)
 
 MODEL = "gpt-4o-mini"
 
+# Bump a stage's version whenever its prompt template changes
+# (part of the LLM response cache key)
+PROMPT_VERSIONS = {
+    "evaluate": 1,
+    "polish": 1,
+    "augment": 1,
+    "evaluate_structured": 1,
+}
+
 CACHE_DIR = "cache"
-CACHE_FILE = os.path.join(CACHE_DIR, "vector_store_cache.json")
+POLICY_META_FILE = os.path.join(CACHE_DIR, "policy_cache.json")
+LEGACY_EMBEDDINGS_FILE = os.path.join(CACHE_DIR, "policy_embeddings.jsonl")
+
+# "openai" -> the model backend's vector stores (remote search per query;
+#             in-process with MODEL_BACKEND=offline)
+# "local"  -> in-process NumPy index (one batched matmul per analysis)
+# "bm25"   -> lexical index only (agent/lexical_index.py, no network at all)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "openai").lower()
+LOCAL_STORE_PREFIX = "local:"
+BM25_STORE_PREFIX = "bm25:"
+
+# "off"       -> semantic retrieval only
+# "prefilter" -> also build a BM25 index at ingest; query chunks whose best
+#                lexical score reaches LEXICAL_PREFILTER_MIN skip the vector
+#                search, and both rankings are merged by reciprocal-rank fusion
+# 0.35: on the sample uploads, a top chunk at or above it covered >= 80% of
+# the query's idf weight (about a third of incident query chunks)
+LEXICAL_MODE = os.getenv("LEXICAL_MODE", "off").lower()
+LEXICAL_PREFILTER_MIN = float(os.getenv("LEXICAL_PREFILTER_MIN", "0.35"))
+LEXICAL_RRF_K = float(os.getenv("LEXICAL_RRF_K", "60"))
+
+EMBED_BATCH_SIZE = 256
+
+# Bump when read_pdf_text / normalize_text / sentence splitting change output
+# (invalidates cache/documents/)
+EXTRACTOR_VERSION = 1
+
+# Max in-flight vector_stores.search calls per analysis (1 = sequential)
+RETRIEVAL_CONCURRENCY = int(os.getenv("RETRIEVAL_CONCURRENCY", "8"))
+
+
+# "llm"   -> polish_and_group_violations makes a second model call
+# "local" -> deterministic parser/grouper (agent/report_format.py), no model call
+POLISH_MODE = os.getenv("POLISH_MODE", "llm").lower()
+
+# "text"       -> evaluate_incident (free text) + polish pass
+# "structured" -> one JSON-schema call parsed into an EvaluationReport
+EVAL_MODE = os.getenv("EVAL_MODE", "text").lower()
+
+# Several policies per incident:
+# "merged"     -> one evaluation over one evidence set tagged with each chunk's policy
+# "per_policy" -> one evaluation per policy (run in parallel), reports combined
+MULTI_POLICY_MODE = os.getenv("MULTI_POLICY_MODE", "merged").lower()
+
+# Streaming: push accumulated text every N deltas or M seconds (whichever first)
+STREAM_DELTA_TOKENS = int(os.getenv("STREAM_DELTA_TOKENS", "24"))
+STREAM_DELTA_SECONDS = float(os.getenv("STREAM_DELTA_MS", "150")) / 1000
+
+# CPU-bound work (PDF parsing, tokenization) offloaded from the event loop
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(min(8, (os.cpu_count() or 2)))))
 
 
 # --------------------------------------------------
 # Utilities
 # --------------------------------------------------
 
-def ensure_nltk_punkt():
-    """
-    Ensure all required NLTK sentence tokenizer resources are installed.
-    Required for nltk>=3.8 which separates punkt and punkt_tab.
-    """
-    resources = [
-        "tokenizers/punkt",
-        "tokenizers/punkt_tab/english",
-    ]
-
-    for resource in resources:
-        try:
-            nltk.data.find(resource)
-        except LookupError:
-            if "punkt_tab" in resource:
-                nltk.download("punkt_tab", quiet=True)
-            else:
-                nltk.download("punkt", quiet=True)
-
-def sentence_chunks_adaptive(
+def sentence_chunk_spans(
     text: str,
+    sentence_spans: List[Tuple[int, int]],
     target_queries: int = 8,
     min_sentences: int = 4,
     max_sentences_cap: int = 14,
     overlap_ratio: float = 0.25,   # 25% of chunk sentences as overlap
     max_query_chars: int = MAX_QUERY_CHARS,
-) -> List[str]:
+) -> List[Tuple[int, int]]:
     """
-    Adaptive sentence chunking:
-    - Chooses max_sentences so total chunks ~ target_queries
-    - Chooses overlap as a fraction of chunk size (bounded)
-    - Enforces max_query_chars
-    - No summarization, no keywords, no extra LLM calls
+    Adaptive sentence chunking over offsets (linear time, no string joins):
+    - sentence_spans: (start, end) of each sentence in the normalized text
+    - Returns (start, end) character spans into text, one per chunk
+    - Same sizing rules as sentence_chunks_adaptive; max_query_chars is enforced
+      by a binary search over sentence end offsets instead of re-joining
     """
-    if not text:
+    n = len(sentence_spans)
+    if n == 0:
         return []
 
-    ensure_nltk_punkt()
-    text = normalize_text(text)
-
-    from nltk.tokenize import sent_tokenize
-    sents = [s.strip() for s in sent_tokenize(text) if s.strip()]
-    if not sents:
-        return [text[:max_query_chars].strip()] if text.strip() else []
-
-    n = len(sents)
-
     # Choose chunk sentence count so that #chunks ≈ target_queries
     # chunks ≈ ceil(n / step), step = max_sentences - overlap
     # We'll start by aiming for step ≈ ceil(n / target_queries)
@@ -106,54 +171,73 @@ def sentence_chunks_adaptive(
 
     step = max(1, max_sentences - overlap)
 
-    chunks: List[str] = []
-    i = 0
-    while i < n:
-        chunk_sents = sents[i:i + max_sentences]
-        chunk = " ".join(chunk_sents).strip()
-
-        # Enforce max_query_chars:
-        # If too long, shrink by dropping sentences from the end until it fits.
-        if len(chunk) > max_query_chars:
-            j = len(chunk_sents)
-            while j > 1:
-                j -= 1
-                chunk = " ".join(chunk_sents[:j]).strip()
-                if len(chunk) <= max_query_chars:
-                    break
-            if len(chunk) > max_query_chars:
-                chunk = chunk[:max_query_chars].strip()
+    ends = [e for _, e in sentence_spans]
 
-        if chunk:
-            chunks.append(chunk)
+    spans: List[Tuple[int, int]] = []
+    for i in range(0, n, step):
+        start = sentence_spans[i][0]
 
-        i += step
+        # Largest j <= i + max_sentences whose chunk (sentences i..j-1) fits;
+        # at least one sentence, truncated to max_query_chars if it alone is too long.
+        fits = bisect.bisect_right(ends, start + max_query_chars, lo=i, hi=min(n, i + max_sentences))
+        j = max(fits, i + 1)
+        end = min(ends[j - 1], start + max_query_chars)
+        while end > start and text[end - 1].isspace():
+            end -= 1
 
-    return chunks
+        if end > start:
+            spans.append((start, end))
 
+    return spans
 
 
+def sentence_chunks_adaptive(
+    text: str,
+    target_queries: int = 8,
+    min_sentences: int = 4,
+    max_sentences_cap: int = 14,
+    overlap_ratio: float = 0.25,   # 25% of chunk sentences as overlap
+    max_query_chars: int = MAX_QUERY_CHARS,
+    sentence_spans: Optional[List[Tuple[int, int]]] = None,
+) -> List[str]:
+    """
+    Adaptive sentence chunking:
+    - Chooses max_sentences so total chunks ~ target_queries
+    - Chooses overlap as a fraction of chunk size (bounded)
+    - Enforces max_query_chars
+    - No summarization, no keywords, no extra LLM calls
+    - sentence_spans: sentence offsets into the (already normalized) text,
+      e.g. from the document cache, to skip tokenization
+    Chunks are materialized from sentence_chunk_spans.
+    """
+    if not text:
+        return []
 
-def split_into_sentences_nltk(text: str) -> List[str]:
-    import nltk
-    try:
-        from nltk.tokenize import sent_tokenize
-    except Exception:
-        raise
-
-    # If punkt isn't installed, this will throw LookupError
-    try:
-        sents = sent_tokenize(text)
-    except LookupError:
-        nltk.download("punkt")
-        sents = sent_tokenize(text)
-
-    return [s.strip() for s in sents if s.strip()]
+    if sentence_spans is None:
+        text = normalize_text(text)
+        sentence_spans = get_segmenter().span_tokenize(text)
+    if not sentence_spans:
+        return [text[:max_query_chars].strip()] if text.strip() else []
 
+    spans = sentence_chunk_spans(
+        text,
+        sentence_spans,
+        target_queries=target_queries,
+        min_sentences=min_sentences,
+        max_sentences_cap=max_sentences_cap,
+        overlap_ratio=overlap_ratio,
+        max_query_chars=max_query_chars,
+    )
+    return [text[s:e] for s, e in spans]
 
 
-def ensure_cache_dir():
-    os.makedirs(CACHE_DIR, exist_ok=True)
+def split_sentences(text: str) -> List[str]:
+    """
+    Sentence split of already-normalized text (stripped, non-empty).
+    Uses the process-wide segmenter (Punkt loaded once; SEGMENTER_MODE=regex
+    for the fast path).
+    """
+    return get_segmenter().segment(text)
 
 
 def sha256_file(path: str) -> str:
@@ -164,38 +248,70 @@ def sha256_file(path: str) -> str:
     return h.hexdigest()
 
 
-def load_cache():
-    if not os.path.exists(CACHE_FILE):
+def load_policy_meta() -> dict:
+    """
+    Chunking + embedding settings recorded in cache/policy_cache.json.
+    """
+    if not os.path.exists(POLICY_META_FILE):
         return {}
-    with open(CACHE_FILE, "r") as f:
+    with open(POLICY_META_FILE, "r") as f:
         return json.load(f)
 
 
-def save_cache(data):
-    ensure_cache_dir()
-    with open(CACHE_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+_POLICY_META = load_policy_meta()
+EMBEDDING_MODEL = _POLICY_META.get("embedding_model", "text-embedding-3-small")
+POLICY_MAX_SENTENCES = int(_POLICY_META.get("max_sentences", 6))
+POLICY_OVERLAP = int(_POLICY_META.get("overlap", 2))
 
 
-def read_pdf_text(path: str) -> str:
-    parts = []
+def read_pdf_pages(path: str, parallel: Optional[bool] = None) -> List[str]:
+    """
+    Extracted text of every page, in page order (blank pages included).
+    parallel: None = auto (process pool at/above PARALLEL_PAGE_THRESHOLD pages),
+              True/False = force on/off.
+    """
     with open(path, "rb") as f:
         reader = PdfReader(f)
-        for page in reader.pages:
-            t = page.extract_text() or ""
-            if t.strip():
-                parts.append(t)
+        n_pages = len(reader.pages)
+        if parallel is None:
+            parallel = n_pages >= PARALLEL_PAGE_THRESHOLD
+        if parallel and n_pages > 1:
+            return extract_pages_parallel(path, n_pages)
+        return [page.extract_text() or "" for page in reader.pages]
+
+
+def read_pdf_text(path: str, parallel: Optional[bool] = None) -> str:
+    """
+    Non-blank pages joined by newlines (see text_normalize.normalize_pages for
+    the page-aware normalized variant).
+    """
+    parts = [t for t in read_pdf_pages(path, parallel=parallel) if t.strip()]
     return "\n".join(parts)
 
 
-def normalize_text(text: str) -> str:
-    # Fix Windows line breaks and PDF artifacts
-    text = text.replace("\r", " ")
-    text = text.replace("\n", " ")
-    text = text.replace("\xa0", " ")
-    text = re.sub(r"\(cid:\d+\)", " ", text)
-    text = re.sub(r"\s{2,}", " ", text)
-    return text.strip()
+def load_document(path: str, file_hash: Optional[str] = None) -> ParsedDocument:
+    """
+    Normalized text + sentence boundaries for a PDF, via cache/documents/.
+    - Keyed by file SHA-256 + EXTRACTOR_VERSION + segmenter mode (the
+      sentence spans of punkt and regex differ)
+    - A repeat analysis of the same file skips PdfReader and Punkt entirely
+    """
+    file_hash = file_hash or sha256_file(path)
+    segmenter = get_segmenter()
+    version = f"{EXTRACTOR_VERSION}-{segmenter.mode}"
+    doc = load_cached_document(file_hash, version)
+    if doc is not None:
+        record_cache("document", hits=1)
+        return doc
+    record_cache("document", misses=1)
+
+    text = normalize_text(read_pdf_text(path))
+    doc = ParsedDocument(
+        text=text,
+        sentence_spans=segmenter.span_tokenize(text) if text else [],
+    )
+    save_cached_document(file_hash, version, doc)
+    return doc
 
 
 #might be extra and unnecessary
@@ -218,103 +334,388 @@ def dedupe_chunks(chunks: List[Tuple[float, str]]) -> List[Tuple[float, str]]:
 
 
 # --------------------------------------------------
-# Vector Store
+# Local embeddings (used by the "local" vector backend)
 # --------------------------------------------------
 
-def get_or_create_vector_store(policy_pdf_path: str) -> str:
-    file_hash = sha256_file(policy_pdf_path)
-    cache = load_cache()
+def embed_texts(texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
+    """
+    Embed many texts with as few requests as possible (batched input).
+    Output order matches input order.
+    """
+    backend = get_backend()
+    vectors: List[List[float]] = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch = texts[start:start + EMBED_BATCH_SIZE]
+        batch_vectors, usage = backend.embed(batch, model)
+        record_usage("embed", usage)
+        vectors.extend(batch_vectors)
+    return vectors
 
-    if file_hash in cache:
-        cached_value = cache[file_hash]
-        if isinstance(cached_value, dict):
-            return cached_value.get("vector_store_id")
-        return cached_value
 
-    vs = client.vector_stores.create(
-        name=f"policy-{file_hash[:10]}"
+def embed_queries(texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
+    """
+    Query-side embedding with the persistent LRU cache (cache/query_embeddings.sqlite).
+    - Keyed by normalized chunk text + embedding model
+    - All cache misses go out in ONE batched embeddings request
+    - Fully cached inputs make no API call
+    """
+    normalized = [normalize_chunk(t) for t in texts]
+    cache_model = get_backend().model_id(model)
+    keys = [embedding_key(t, cache_model) for t in normalized]
+
+    cache = get_embedding_cache()
+    found = cache.get_many(keys)
+
+    missing: Dict[str, str] = {}  # key -> text (deduped, input order)
+    for key, text in zip(keys, normalized):
+        if key not in found and key not in missing:
+            missing[key] = text
+
+    if missing:
+        fresh = dict(zip(missing, embed_texts(list(missing.values()), model=model)))
+        cache.put_many(cache_model, fresh)
+        found.update(fresh)
+
+    record_cache("embedding", hits=len(texts) - len(missing), misses=len(missing))
+    print(
+        f"[embed_queries] {len(texts)} queries, "
+        f"{len(texts) - len(missing)} cached, {len(missing)} embedded."
     )
+    return [found[k] for k in keys]
+
 
-    with open(policy_pdf_path, "rb") as f:
-        client.vector_stores.files.upload_and_poll(
-            vector_store_id=vs.id,
-            file=f,
+def policy_sentence_windows(
+    text: str,
+    max_sentences: int = POLICY_MAX_SENTENCES,
+    overlap: int = POLICY_OVERLAP,
+    sentence_spans: Optional[List[Tuple[int, int]]] = None,
+) -> List[str]:
+    """
+    Split a policy into overlapping sentence windows for local indexing.
+    Defaults come from cache/policy_cache.json (max_sentences / overlap).
+    sentence_spans: offsets into the (already normalized) text, if known.
+    """
+    if not text:
+        return []
+
+    if sentence_spans is None:
+        text = normalize_text(text)
+        sentence_spans = get_segmenter().span_tokenize(text)
+    n = len(sentence_spans)
+    if not n:
+        return []
+
+    step = max(1, max_sentences - overlap)
+    windows: List[str] = []
+    for i in range(0, n, step):
+        last = min(n, i + max_sentences) - 1
+        windows.append(text[sentence_spans[i][0]:sentence_spans[last][1]])
+        if i + max_sentences >= n:
+            break
+    return windows
+
+
+def get_or_create_local_index(
+    policy_pdf_path: str,
+    file_hash: Optional[str] = None,
+) -> str:
+    """
+    Local counterpart of get_or_create_vector_store.
+    Returns "local:<sha256>" so retrieve_top_chunks can route the search
+    ("local:<sha256>-<backend>" for non-OpenAI embeddings, kept apart on disk).
+    """
+    file_hash = file_hash or sha256_file(policy_pdf_path)
+    model_backend = get_backend()
+    key = file_hash if model_backend.name == "openai" else f"{file_hash}-{model_backend.name}"
+    if load_local_index(key) is not None:
+        return LOCAL_STORE_PREFIX + key
+
+    with vector_store_cache.single_flight(f"local-{key}"):
+        if load_local_index(key) is not None:
+            return LOCAL_STORE_PREFIX + key
+
+        if (
+            key == _POLICY_META.get("policy_hash")
+            and os.path.exists(LEGACY_EMBEDDINGS_FILE)
+        ):
+            chunks, embeddings = load_legacy_embeddings(LEGACY_EMBEDDINGS_FILE)
+        else:
+            doc = load_document(policy_pdf_path, file_hash=file_hash)
+            chunks = policy_sentence_windows(doc.text, sentence_spans=doc.sentence_spans)
+            embeddings = embed_texts(chunks)
+
+        save_local_index(key, chunks, embeddings)
+        print(f"[get_or_create_local_index] Indexed {len(chunks)} policy chunks.")
+    return LOCAL_STORE_PREFIX + key
+
+
+def get_or_create_lexical_index(
+    policy_pdf_path: str,
+    file_hash: Optional[str] = None,
+) -> str:
+    """
+    Build the policy's BM25 index once (same chunks as the local vector index).
+    Returns "bm25:<sha256>" so retrieve_top_chunks can route the search.
+    """
+    file_hash = file_hash or sha256_file(policy_pdf_path)
+    if load_bm25_index(file_hash) is not None:
+        return BM25_STORE_PREFIX + file_hash
+
+    with vector_store_cache.single_flight(f"bm25-{file_hash}"):
+        if load_bm25_index(file_hash) is None:
+            doc = load_document(policy_pdf_path, file_hash=file_hash)
+            chunks = policy_sentence_windows(doc.text, sentence_spans=doc.sentence_spans)
+            save_bm25_index(file_hash, chunks)
+            print(f"[get_or_create_lexical_index] Indexed {len(chunks)} policy chunks.")
+    return BM25_STORE_PREFIX + file_hash
+
+
+# --------------------------------------------------
+# Vector Store
+# --------------------------------------------------
+
+def get_or_create_vector_store(
+    policy_pdf_path: str,
+    backend: Optional[str] = None,
+    file_hash: Optional[str] = None,
+) -> str:
+    """
+    file_hash: SHA-256 already computed at upload time (skips re-reading the file).
+    """
+    backend = backend or VECTOR_BACKEND
+    file_hash = file_hash or sha256_file(policy_pdf_path)
+
+    if backend == "bm25":
+        return get_or_create_lexical_index(policy_pdf_path, file_hash=file_hash)
+    if LEXICAL_MODE == "prefilter":
+        get_or_create_lexical_index(policy_pdf_path, file_hash=file_hash)
+
+    if backend == "local":
+        return get_or_create_local_index(policy_pdf_path, file_hash=file_hash)
+
+    model_backend = get_backend()
+
+    def policy_chunks() -> List[str]:
+        doc = load_document(policy_pdf_path, file_hash=file_hash)
+        return policy_sentence_windows(doc.text, sentence_spans=doc.sentence_spans)
+
+    def create() -> str:
+        return model_backend.create_vector_store(
+            f"policy-{file_hash[:10]}", policy_pdf_path, policy_chunks
         )
 
-    cache[file_hash] = vs.id
-    save_cache(cache)
+    if not model_backend.durable_stores:
+        return create()
 
-    return vs.id
+    # memoized, single-flight per policy hash, atomic cache writes
+    return vector_store_cache.get_or_create(file_hash, create)
 
 
 # --------------------------------------------------
 # Retrieval (Pure semantic, no keywords)
 # --------------------------------------------------
 
+def _search_queries(
+    vector_store_id: str,
+    queries: List[str],
+    per_query_k: int,
+    max_concurrency: Optional[int] = None,
+) -> List[List[Tuple[float, str]]]:
+    """
+    Run every query against the store; one [(score, text), ...] list per query.
+    - "local:<hash>" ids: one embeddings request + one matmul for all queries
+    - "bm25:<hash>" ids: lexical index only, no network
+    - Other ids: one backend search call per query, fanned out over a
+      bounded thread pool (max_concurrency, default RETRIEVAL_CONCURRENCY)
+    """
+    if vector_store_id.startswith(BM25_STORE_PREFIX):
+        index = load_bm25_index(vector_store_id[len(BM25_STORE_PREFIX):])
+        if index is None:
+            raise RuntimeError(f"Lexical index not found: {vector_store_id}")
+        return index.search(queries, per_query_k)
+
+    if vector_store_id.startswith(LOCAL_STORE_PREFIX):
+        index = load_local_index(vector_store_id[len(LOCAL_STORE_PREFIX):])
+        if index is None:
+            raise RuntimeError(f"Local index not found: {vector_store_id}")
+        return index.search(embed_queries(queries), per_query_k)
+
+    model_backend = get_backend()
+
+    def search_one(q: str) -> List[Tuple[float, str]]:
+        return model_backend.search(vector_store_id, q, per_query_k)
+
+    workers = max(1, min(max_concurrency or RETRIEVAL_CONCURRENCY, len(queries)))
+    if workers == 1:
+        return [search_one(q) for q in queries]
+
+    # map() yields in query order, so the merge sees the same sequence
+    # as the sequential loop regardless of completion order.
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(search_one, queries))
+
+
+def _lexical_prefilter(
+    vector_store_id: str,
+    queries: List[str],
+    per_query_k: int,
+) -> Tuple[Optional[List[List[Tuple[float, str]]]], List[str]]:
+    """
+    LEXICAL_MODE=prefilter: BM25 hits per query + the queries that still need
+    a vector search (best lexical score below LEXICAL_PREFILTER_MIN).
+    Returns (None, queries) when the mode is off or the policy has no lexical index.
+    """
+    if LEXICAL_MODE != "prefilter" or vector_store_id.startswith(BM25_STORE_PREFIX):
+        return None, queries
+
+    if vector_store_id.startswith(LOCAL_STORE_PREFIX):
+        policy_hash = vector_store_id[len(LOCAL_STORE_PREFIX):]
+    else:
+        policy_hash = vector_store_cache.policy_hash_for(vector_store_id)
+    index = load_bm25_index(policy_hash) if policy_hash else None
+    if index is None:
+        return None, queries
+
+    lexical = index.search(queries, per_query_k)
+    remaining = [
+        q for q, hits in zip(queries, lexical)
+        if not hits or hits[0][0] < LEXICAL_PREFILTER_MIN
+    ]
+    print(
+        f"[lexical_prefilter] {len(queries) - len(remaining)}/{len(queries)} "
+        "query chunks answered lexically (vector search skipped)."
+    )
+    return lexical, remaining
+
+
 def retrieve_top_chunks(
     vector_store_id: str,
     incident_text: str,
     top_k: int = 8,
     target_queries: int = 8,
     per_query_k: int = 6,
+    max_concurrency: Optional[int] = None,
+    sentence_spans: Optional[List[Tuple[int, int]]] = None,
+    near_dup_threshold: Optional[float] = None,
 ) -> List[Tuple[float, str]]:
     # 1) Make multiple sentence-based queries (adaptive, bounded)
     queries = sentence_chunks_adaptive(
         incident_text,
         target_queries=target_queries,
         max_query_chars=MAX_QUERY_CHARS,
+        sentence_spans=sentence_spans,
     )
 
     print(f"[retrieve_top_chunks] Generated {len(queries)} query chunks from incident.")
+    tag(query_chunks=len(queries))
     if not queries:
         return []
 
     # 2) Run vector search per query and merge results
-    best: Dict[str, Tuple[float, str]] = {}  # normalized_text -> (best_score, original_text)
-
-    for q in queries:
-        q = q[:MAX_QUERY_CHARS].strip()
-        if not q:
-            continue
-
-        results = client.vector_stores.search(
-            vector_store_id=vector_store_id,
-            query=q,
-            max_num_results=per_query_k,
+    queries = [q[:MAX_QUERY_CHARS].strip() for q in queries]
+    queries = [q for q in queries if q]
+
+    lexical, queries = _lexical_prefilter(vector_store_id, queries, per_query_k)
+    per_query: List[List[Tuple[float, str]]] = []
+    if queries:
+        per_query = _search_queries(
+            vector_store_id, queries, per_query_k, max_concurrency=max_concurrency
         )
+    return _merge_results(per_query, top_k, near_dup_threshold, lexical=lexical)
 
-        for item in results.data:
-            if not item.content:
-                continue
 
-            score = float(item.score)
-            text = normalize_text(item.content[0].text)
+def _best_by_text(
+    per_query: List[List[Tuple[float, str]]],
+) -> Dict[str, Tuple[float, str]]:
+    best: Dict[str, Tuple[float, str]] = {}  # normalized_text -> (best_score, original_text)
+
+    for results in per_query:
+        for score, raw_text in results:
+            text = normalize_chunk(raw_text)
 
             # normalize for dedupe key
             key = re.sub(r"\s+", " ", text).strip().lower()
 
+            # ties keep the earliest (query order, then rank) occurrence
             prev = best.get(key)
             if prev is None or score > prev[0]:
                 best[key] = (score, text)
+    return best
 
-    merged = list(best.values())
-    merged.sort(key=lambda x: x[0], reverse=True)
 
-    # 3) Your existing deduper (extra safety)
-    #merged = dedupe_chunks(merged)
+def _merge_results(
+    per_query: List[List[Tuple[float, str]]],
+    top_k: int,
+    near_dup_threshold: Optional[float] = None,
+    lexical: Optional[List[List[Tuple[float, str]]]] = None,
+) -> List[Tuple[float, str]]:
+    """
+    Merge per-query hits into one ranked list (best score per normalized text).
+    lexical: BM25 hits. Their scores are not comparable with the vector
+    scores (and with VECTOR_BACKEND=openai the chunk texts differ too), so
+    the two rankings are fused by rank: each chunk scores
+    sum(1 / (LEXICAL_RRF_K + rank)) over the lists it appears in.
+    Near-duplicates (MinHash containment >= near_dup_threshold, default
+    NEAR_DUP_THRESHOLD) of a better-scored chunk are dropped.
+    Shared by the sync and async retrieval paths.
+    """
+    # stable sort: equal scores stay in first-seen order
+    merged = list(_best_by_text(per_query).items())
+    merged.sort(key=lambda x: x[1][0], reverse=True)
+
+    if lexical:
+        ranked_lexical = list(_best_by_text(lexical).items())
+        ranked_lexical.sort(key=lambda x: x[1][0], reverse=True)
+
+        fused: Dict[str, Tuple[float, str]] = {}
+        for ranking in (merged, ranked_lexical):
+            for rank, (key, (_, text)) in enumerate(ranking, 1):
+                prev = fused.get(key)
+                score = 1.0 / (LEXICAL_RRF_K + rank)
+                fused[key] = (prev[0] + score, prev[1]) if prev else (score, text)
+        merged = list(fused.items())
+        merged.sort(key=lambda x: x[1][0], reverse=True)
+
+    merged = [hit for _, hit in merged]
+
+    # 3) Near-duplicate suppression (overlapping policy windows)
+    merged = suppress_near_duplicates(
+        merged,
+        NEAR_DUP_THRESHOLD if near_dup_threshold is None else near_dup_threshold,
+    )
 
     # 4) Return top_k overall
     return merged[:top_k]
 
-def polish_and_group_violations(final_eval_text: str) -> str:
+# --------------------------------------------------
+# LLM calls (temperature=0 -> cached on disk)
+# --------------------------------------------------
+
+def _complete(stage: str, prompt: str, bypass_cache: bool = False, **request) -> str:
     """
-    Post-processor agent (chunk-aware):
-    - Groups duplicates under minimal parents
-    - NEVER drops or edits chunk citations like [Chunk 3]
-    - Evidence lines must remain verbatim INCLUDING chunk tags
+    One deterministic Responses call, served from cache/llm_responses.sqlite
+    when the same (model, stage, template version, prompt) was seen before.
+    Extra keyword arguments (e.g. text=...) go to responses.create.
     """
-
-    prompt = f"""
+    model_backend = get_backend()
+    model = model_backend.model_id(MODEL)
+    cache = get_response_cache()
+    key = response_key(model, stage, PROMPT_VERSIONS[stage], prompt)
+    cached = cache.get(key, stage, bypass=bypass_cache)
+    if cached is not None:
+        record_cache("llm", hits=1)
+        return cached
+    record_cache("llm", misses=1)
+
+    text, usage = model_backend.respond(stage, MODEL, prompt, **request)
+    record_usage(stage, usage)
+    text = text.strip()
+    cache.put(key, stage, model, text, bypass=bypass_cache)
+    return text
+
+
+def build_polish_prompt(final_eval_text: str) -> str:
+    return f"""
 You are a *polishing / structuring agent*.
 
 You will be given an evaluation text that includes Evidence lines formatted like:
@@ -377,35 +778,34 @@ HERE IS THE TEXT TO POLISH:
 {final_eval_text}
 """.strip()
 
-    response = client.responses.create(
-        model=MODEL,
-        input=prompt,
-        temperature=0,
-    )
 
-    return response.output_text.strip()
+def polish_and_group_violations(final_eval_text: str, mode: Optional[str] = None) -> str:
+    """
+    Post-processor agent (chunk-aware):
+    - Groups duplicates under minimal parents
+    - NEVER drops or edits chunk citations like [Chunk 3]
+    - Evidence lines must remain verbatim INCLUDING chunk tags
+    - mode="local" (or POLISH_MODE=local): deterministic grouping, no LLM call
+    """
+    if (mode or POLISH_MODE) == "local":
+        return group_violations_locally(final_eval_text)
+
+    prompt = build_polish_prompt(final_eval_text)
+
+    return _complete("polish", prompt)
 # --------------------------------------------------
 # Evaluation (Prompt ONLY improved)
 # --------------------------------------------------
-def evaluate_incident(
+def build_evaluation_prompt(
     top_chunks: List[Tuple[float, str]],
     incident_text: str
 ) -> str:
-    """
-    Evaluator with chunk-aware evidence citations.
-    - Adds chunk number(s) for each Evidence / Additional evidence sentence.
-    - Still: pure semantic (no keyword heuristics), minimal parent grouping, full action coverage.
-    """
-
-    if not top_chunks:
-        return "Decision: Not enough policy evidence\nReason: No policy excerpts retrieved."
-
     policy_text = "\n\n".join(
         f"[Chunk {i+1}]\n{chunk}"
         for i, (_, chunk) in enumerate(top_chunks)
     )
 
-    prompt = f"""
+    return f"""
 You are evaluating an incident against policy text.
 
 Incident:
@@ -486,35 +886,80 @@ SELF-CHECK:
 - Redundancy: merge duplicate parents.
 """.strip()
 
-    response = client.responses.create(
-        model=MODEL,
-        input=prompt,
-        temperature=0,
-    )
 
-    return response.output_text.strip()
+def evaluate_incident(
+    top_chunks: List[Tuple[float, str]],
+    incident_text: str
+) -> str:
+    """
+    Evaluator with chunk-aware evidence citations.
+    - Adds chunk number(s) for each Evidence / Additional evidence sentence.
+    - Still: pure semantic (no keyword heuristics), minimal parent grouping, full action coverage.
+    """
+
+    if not top_chunks:
+        return "Decision: Not enough policy evidence\nReason: No policy excerpts retrieved."
+
+    prompt = build_evaluation_prompt(top_chunks, incident_text)
+
+    return _complete("evaluate", prompt)
 
     
-def augment_missing_children_from_incident(
-    incident_text: str,
-    current_eval_text: str,
+_STRUCTURED_OUTPUT_FORMAT = """
+OUTPUT FORMAT:
+Return ONLY a JSON object matching the provided schema.
+- decision: "Violation", "No violation" or "Not enough policy evidence".
+- parents: one entry per DISTINCT violation (merge duplicates; for "No violation"
+  use one entry holding the permitting evidence and the incident fact).
+  - evidence: exactly ONE {chunk, quote}: quote is one exact RULE sentence copied
+    verbatim (no surrounding quotes), chunk is N from its [Chunk N].
+  - additional_evidence: only if needed; same shape; otherwise [].
+  - children: every incident action under this parent as
+    {incident_fact: 3–12 words copied verbatim from the incident, why: 1 sentence}.
+- unmapped_actions: incident actions with "Not enough policy evidence", else [].
+- reason: the Why (No violation) or Reason (Not enough policy evidence); "" for Violation.
+
+"""
+
+
+def build_structured_evaluation_prompt(
+    top_chunks: List[Tuple[float, str]],
+    incident_text: str
 ) -> str:
     """
-    Augmentation agent:
-    - Input: incident_text + current evaluation text (already produced by evaluate_incident or by a prior step)
-    - Output: same format, but with any *missing* child incidents added under existing parents
-      when the parent Evidence already covers the behavior.
+    Same constraints as build_evaluation_prompt, JSON output instead of text.
+    """
+    prompt = build_evaluation_prompt(top_chunks, incident_text)
+    head, _, rest = prompt.partition("OUTPUT FORMAT (exact):")
+    _, _, self_check = rest.partition("SELF-CHECK:")
+    return (head + _STRUCTURED_OUTPUT_FORMAT.lstrip("\n") + "SELF-CHECK:" + self_check).strip()
 
-    This does NOT require new policy quotes, so it works even when the policy excerpts
-    don’t contain a perfect standalone 'rule sentence' for the missed issue.
 
-    Hard guarantees:
-    - Never remove or rewrite existing parents/children (only ADD).
-    - Every added child must quote 3–12 words verbatim from the incident_text.
-    - Added children must fit under an existing parent’s Evidence (no inventing new rule coverage).
+def evaluate_incident_structured(
+    top_chunks: List[Tuple[float, str]],
+    incident_text: str
+) -> EvaluationReport:
     """
+    Single-call evaluation (EVAL_MODE=structured):
+    - JSON-schema structured output parsed into a typed EvaluationReport
+    - Parents with matching evidence are merged locally (no polish round trip)
+    """
+    if not top_chunks:
+        return EvaluationReport(
+            decision="Not enough policy evidence",
+            reason="No policy excerpts retrieved.",
+        )
 
-    prompt = f"""
+    prompt = build_structured_evaluation_prompt(top_chunks, incident_text)
+    raw = _complete("evaluate_structured", prompt, text={"format": EVALUATION_FORMAT})
+    return group_parents(report_from_json(json.loads(raw)))
+
+
+def build_augment_prompt(
+    incident_text: str,
+    current_eval_text: str,
+) -> str:
+    return f"""
 You are an augmentation agent.
 
 You will be given:
@@ -550,22 +995,320 @@ CURRENT EVALUATION:
 {current_eval_text}
 """.strip()
 
-    response = client.responses.create(
-        model=MODEL,
-        input=prompt,
-        temperature=0,
+
+def augment_missing_children_from_incident(
+    incident_text: str,
+    current_eval_text: str,
+) -> str:
+    """
+    Augmentation agent:
+    - Input: incident_text + current evaluation text (already produced by evaluate_incident or by a prior step)
+    - Output: same format, but with any *missing* child incidents added under existing parents
+      when the parent Evidence already covers the behavior.
+
+    This does NOT require new policy quotes, so it works even when the policy excerpts
+    don’t contain a perfect standalone 'rule sentence' for the missed issue.
+
+    Hard guarantees:
+    - Never remove or rewrite existing parents/children (only ADD).
+    - Every added child must quote 3–12 words verbatim from the incident_text.
+    - Added children must fit under an existing parent’s Evidence (no inventing new rule coverage).
+    """
+
+    prompt = build_augment_prompt(incident_text, current_eval_text)
+
+    return _complete("augment", prompt)
+
+# --------------------------------------------------
+# Async pipeline (non-blocking; used by the Reflex backend)
+# --------------------------------------------------
+
+_cpu_pool: Optional[ThreadPoolExecutor] = None
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """
+    Run blocking/CPU work on the shared executor so the event loop stays free.
+    """
+    global _cpu_pool
+    if _cpu_pool is None:
+        _cpu_pool = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+    loop = asyncio.get_running_loop()
+    # carry the caller's context (open tracing span) into the worker thread
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_cpu_pool, lambda: ctx.run(fn, *args, **kwargs))
+
+
+async def aread_pdf_text(path: str) -> str:
+    return await run_cpu(read_pdf_text, path)
+
+
+async def aload_document(path: str, file_hash: Optional[str] = None) -> ParsedDocument:
+    return await run_cpu(load_document, path, file_hash=file_hash)
+
+
+async def aget_or_create_vector_store(
+    policy_pdf_path: str,
+    backend: Optional[str] = None,
+    file_hash: Optional[str] = None,
+) -> str:
+    # One-off per policy (cached afterwards): run the sync path off-loop.
+    return await run_cpu(
+        get_or_create_vector_store,
+        policy_pdf_path,
+        backend=backend,
+        file_hash=file_hash,
     )
 
-    return response.output_text.strip()
+
+async def aretrieve_top_chunks(
+    vector_store_id: str,
+    incident_text: str,
+    top_k: int = 8,
+    target_queries: int = 8,
+    per_query_k: int = 6,
+    max_concurrency: Optional[int] = None,
+    sentence_spans: Optional[List[Tuple[int, int]]] = None,
+    near_dup_threshold: Optional[float] = None,
+) -> List[Tuple[float, str]]:
+    """
+    Async retrieve_top_chunks: same output, searches run concurrently on the
+    backend's async search (bounded by max_concurrency / RETRIEVAL_CONCURRENCY).
+    """
+    queries = await run_cpu(
+        sentence_chunks_adaptive,
+        incident_text,
+        target_queries=target_queries,
+        max_query_chars=MAX_QUERY_CHARS,
+        sentence_spans=sentence_spans,
+    )
+
+    print(f"[aretrieve_top_chunks] Generated {len(queries)} query chunks from incident.")
+    tag(query_chunks=len(queries))
+    if not queries:
+        return []
+
+    queries = [q[:MAX_QUERY_CHARS].strip() for q in queries]
+    queries = [q for q in queries if q]
+
+    lexical, queries = await run_cpu(_lexical_prefilter, vector_store_id, queries, per_query_k)
+    if not queries or vector_store_id.startswith((LOCAL_STORE_PREFIX, BM25_STORE_PREFIX)):
+        per_query: List[List[Tuple[float, str]]] = []
+        if queries:
+            per_query = await run_cpu(_search_queries, vector_store_id, queries, per_query_k)
+        return await run_cpu(_merge_results, per_query, top_k, near_dup_threshold, lexical)
+
+    model_backend = get_backend()
+    sem = asyncio.Semaphore(max(1, max_concurrency or RETRIEVAL_CONCURRENCY))
+
+    async def search_one(q: str) -> List[Tuple[float, str]]:
+        async with sem:
+            return await model_backend.asearch(vector_store_id, q, per_query_k)
+
+    # gather() keeps query order -> identical merge to the sync path
+    per_query = await asyncio.gather(*(search_one(q) for q in queries))
+    return await run_cpu(_merge_results, list(per_query), top_k, near_dup_threshold, lexical)
+
+
+async def _acomplete(stage: str, prompt: str, bypass_cache: bool = False, **request) -> str:
+    model_backend = get_backend()
+    model = model_backend.model_id(MODEL)
+    cache = get_response_cache()
+    key = response_key(model, stage, PROMPT_VERSIONS[stage], prompt)
+    cached = await run_cpu(cache.get, key, stage, bypass=bypass_cache)
+    if cached is not None:
+        record_cache("llm", hits=1)
+        return cached
+    record_cache("llm", misses=1)
+
+    text, usage = await model_backend.arespond(stage, MODEL, prompt, **request)
+    record_usage(stage, usage)
+    text = text.strip()
+    await run_cpu(cache.put, key, stage, model, text, bypass=bypass_cache)
+    return text
+
+
+async def astream_complete(
+    stage: str,
+    prompt: str,
+    min_tokens: int = STREAM_DELTA_TOKENS,
+    min_interval: float = STREAM_DELTA_SECONDS,
+    bypass_cache: bool = False,
+) -> AsyncIterator[str]:
+    """
+    Streaming _acomplete: yields the accumulated text so far, batched so the
+    UI gets one update per min_tokens deltas or min_interval seconds.
+    The last value yielded is the full (stripped) response. Cache hits
+    yield once. Only a stream that completed is cached; one that fails or
+    ends early raises StreamFailed.
+    """
+    model_backend = get_backend()
+    model = model_backend.model_id(MODEL)
+    cache = get_response_cache()
+    key = response_key(model, stage, PROMPT_VERSIONS[stage], prompt)
+    cached = await run_cpu(cache.get, key, stage, bypass=bypass_cache)
+    if cached is not None:
+        record_cache("llm", hits=1)
+        yield cached
+        return
+    record_cache("llm", misses=1)
+
+    parts: List[str] = []
+    pending = 0
+    last_flush = time.monotonic()
+    completed = False
+    async for delta, usage in model_backend.astream(stage, MODEL, prompt):
+        if delta is None:
+            completed = True
+            record_usage(stage, usage)
+            continue
+        if not delta:
+            continue
+        parts.append(delta)
+        pending += 1
+        now = time.monotonic()
+        if pending >= min_tokens or now - last_flush >= min_interval:
+            yield "".join(parts)
+            pending = 0
+            last_flush = now
+
+    if not completed:
+        # truncated: never replay this as the answer for the prompt
+        raise StreamFailed(f"{stage} stream ended before the response completed.")
+
+    text = "".join(parts).strip()
+    await run_cpu(cache.put, key, stage, model, text, bypass=bypass_cache)
+    yield text
+
+
+async def astream_evaluate_incident(
+    top_chunks: List[Tuple[float, str]],
+    incident_text: str
+) -> AsyncIterator[str]:
+    """
+    aevaluate_incident, streamed (see astream_complete).
+    """
+    if not top_chunks:
+        yield "Decision: Not enough policy evidence\nReason: No policy excerpts retrieved."
+        return
+    prompt = await run_cpu(build_evaluation_prompt, top_chunks, incident_text)
+    async for partial in astream_complete("evaluate", prompt):
+        yield partial
+
+
+async def aevaluate_incident(
+    top_chunks: List[Tuple[float, str]],
+    incident_text: str
+) -> str:
+    if not top_chunks:
+        return "Decision: Not enough policy evidence\nReason: No policy excerpts retrieved."
+    prompt = await run_cpu(build_evaluation_prompt, top_chunks, incident_text)
+    return await _acomplete("evaluate", prompt)
+
+
+async def aevaluate_incident_structured(
+    top_chunks: List[Tuple[float, str]],
+    incident_text: str
+) -> EvaluationReport:
+    if not top_chunks:
+        return EvaluationReport(
+            decision="Not enough policy evidence",
+            reason="No policy excerpts retrieved.",
+        )
+    prompt = await run_cpu(build_structured_evaluation_prompt, top_chunks, incident_text)
+    raw = await _acomplete("evaluate_structured", prompt, text={"format": EVALUATION_FORMAT})
+    return group_parents(report_from_json(json.loads(raw)))
+
+
+async def apolish_and_group_violations(final_eval_text: str, mode: Optional[str] = None) -> str:
+    if (mode or POLISH_MODE) == "local":
+        return await run_cpu(group_violations_locally, final_eval_text)
+    return await _acomplete("polish", build_polish_prompt(final_eval_text))
+
+
+async def aaugment_missing_children_from_incident(
+    incident_text: str,
+    current_eval_text: str,
+) -> str:
+    return await _acomplete("augment", build_augment_prompt(incident_text, current_eval_text))
+
+
+async def aretrieve_policies(
+    vector_store_ids: List[str],
+    incident_text: str,
+    top_k: int = 8,
+    target_queries: int = 8,
+    per_query_k: int = 6,
+    sentence_spans: Optional[List[Tuple[int, int]]] = None,
+) -> List[List[Tuple[float, str]]]:
+    """
+    aretrieve_top_chunks against every store at once; one ranked list per store.
+    RETRIEVAL_CONCURRENCY is split between the stores.
+    """
+    per_store = max(1, RETRIEVAL_CONCURRENCY // max(1, len(vector_store_ids)))
+    results = await asyncio.gather(*(
+        aretrieve_top_chunks(
+            vs_id,
+            incident_text,
+            top_k=top_k,
+            target_queries=target_queries,
+            per_query_k=per_query_k,
+            max_concurrency=per_store,
+            sentence_spans=sentence_spans,
+        )
+        for vs_id in vector_store_ids
+    ))
+    return list(results)
+
+
+async def aevaluate_per_policy(
+    labeled_evidence: List[Tuple[str, List[Tuple[float, str]]]],
+    incident_text: str,
+    chunk_numbers: Optional[List[Dict[int, int]]] = None,
+) -> Tuple[str, EvaluationReport]:
+    """
+    MULTI_POLICY_MODE=per_policy: one evaluation (+ polish) per policy, all in
+    flight together, combined with combine_policy_reports.
+    chunk_numbers: from rank_policy_evidence, so citations match that list.
+    """
+    async def one(evidence: List[Tuple[float, str]]) -> str:
+        if EVAL_MODE == "structured":
+            return render_report(await aevaluate_incident_structured(evidence, incident_text))
+        return await apolish_and_group_violations(await aevaluate_incident(evidence, incident_text))
+
+    reports = await asyncio.gather(*(one(ev) for _, ev in labeled_evidence))
+    labels = [label for label, _ in labeled_evidence]
+    return combine_policy_reports(list(zip(labels, reports)), chunk_numbers)
+
+
+def parse_decision(report: str, default: str = "Not enough policy evidence") -> str:
+    """
+    Decision label from an evaluation/polished report.
+    Pass default="" for partial (streaming) text that may not have it yet.
+    """
+    if "Decision: Violation" in report:
+        return "Violation"
+    if "Decision: No violation" in report:
+        return "No violation"
+    if "Decision: Not enough policy evidence" in report:
+        return "Not enough policy evidence"
+    return default
+
 
 # --------------------------------------------------
 # Main Runner
 # --------------------------------------------------
 
-def run_analysis(policy_pdf: str, incident_pdf: str):
-
-    incident_raw = read_pdf_text(incident_pdf)
-    incident_text = normalize_text(incident_raw)
+def load_incident(
+    incident_pdf: str,
+    file_hash: Optional[str] = None,
+) -> Tuple[str, Optional[List[Tuple[int, int]]]]:
+    """
+    Incident text without template boilerplate + its cached sentence offsets
+    (None when the boilerplate strip changed the text).
+    """
+    incident_doc = load_document(incident_pdf, file_hash=file_hash)
+    incident_text = incident_doc.text
 
     # Remove template boilerplate if exists
     incident_text = re.sub(
@@ -574,17 +1317,182 @@ def run_analysis(policy_pdf: str, incident_pdf: str):
         incident_text,
         flags=re.IGNORECASE
     ).strip()
+    # Cached sentence offsets are only valid for the unmodified text
+    incident_spans = incident_doc.sentence_spans if incident_text == incident_doc.text else None
+    return incident_text, incident_spans
+
+
+def _evaluate_and_polish(
+    top_chunks: List[Tuple[float, str]],
+    incident_text: str,
+    trace: Trace,
+) -> str:
+    if EVAL_MODE == "structured":
+        with trace.span("evaluate", mode="structured"):
+            report = evaluate_incident_structured(top_chunks, incident_text)
+        return render_report(report)
+    with trace.span("evaluate", mode="text"):
+        result = evaluate_incident(top_chunks, incident_text)
+    #result = augment_missing_children_from_incident(incident_text, result)
+    with trace.span("polish"):
+        return polish_and_group_violations(result)
+
+
+def analyze_incident(
+    vector_store_id: str,
+    incident_pdf: str,
+    file_hash: Optional[str] = None,
+    max_concurrency: Optional[int] = None,
+    trace: Optional[Trace] = None,
+) -> Tuple[str, List[Tuple[float, str]], str]:
+    """
+    One incident against an already-created policy store (shared by
+    run_analysis and the batch CLI).
+    - trace: spans are added to it; without one, a trace is opened and
+      finished here
+    Returns (incident_text, evidence chunks, final report).
+    """
+    owned = trace is None
+    trace = trace or Trace("analyze_incident")
+    try:
+        with trace.span("load_incident"):
+            incident_text, incident_spans = load_incident(incident_pdf, file_hash=file_hash)
+
+        with trace.span("retrieve", top_k=8):
+            top_chunks = retrieve_top_chunks(
+                vector_store_id,
+                incident_text,
+                top_k=8,
+                max_concurrency=max_concurrency,
+                sentence_spans=incident_spans,
+            )
+        with trace.span("pack_context") as span:
+            top_chunks = pack_context(top_chunks)
+            span.tags["chunks"] = len(top_chunks)
+
+        result = _evaluate_and_polish(top_chunks, incident_text, trace)
+    except BaseException:
+        if owned:
+            trace.finish("error")
+        raise
+    if owned:
+        trace.finish()
+    return incident_text, top_chunks, result
+
+
+def analyze_incident_multi(
+    policies: List[Tuple[str, str]],
+    incident_pdf: str,
+    mode: Optional[str] = None,
+    trace: Optional[Trace] = None,
+) -> Tuple[str, List[Tuple[float, str]], str]:
+    """
+    One incident against several policies ([(label, vector_store_id), ...]).
+    Every store is searched at once (one thread per policy), so latency stays
+    close to a single-policy run.
+    - mode "merged" (MULTI_POLICY_MODE default): one evaluation over a single
+      evidence set whose excerpts are tagged "(Policy: <label>)"
+    - mode "per_policy": one evaluation per policy, in parallel, then
+      combine_policy_reports
+    - trace: as in analyze_incident
+    Returns (incident_text, evidence chunks, final report).
+    """
+    owned = trace is None
+    trace = trace or Trace("analyze_incident")
+    try:
+        result = _analyze_incident_multi(
+            policies, incident_pdf, mode or MULTI_POLICY_MODE, trace
+        )
+    except BaseException:
+        if owned:
+            trace.finish("error")
+        raise
+    if owned:
+        trace.finish()
+    return result
+
+
+def _analyze_incident_multi(
+    policies: List[Tuple[str, str]],
+    incident_pdf: str,
+    mode: str,
+    trace: Trace,
+) -> Tuple[str, List[Tuple[float, str]], str]:
+    with trace.span("load_incident"):
+        incident_text, incident_spans = load_incident(incident_pdf)
+
+    labels = [label for label, _ in policies]
+    per_store = max(1, RETRIEVAL_CONCURRENCY // max(1, len(policies)))
+    with ThreadPoolExecutor(max_workers=max(1, len(policies))) as pool:
+        with trace.span("retrieve", top_k=8, policies=len(policies)):
+            retrieved = list(pool.map(
+                lambda vs_id: retrieve_top_chunks(
+                    vs_id,
+                    incident_text,
+                    top_k=8,
+                    max_concurrency=per_store,
+                    sentence_spans=incident_spans,
+                ),
+                [vs_id for _, vs_id in policies],
+            ))
+
+        if mode == "per_policy":
+            with trace.span("pack_context"):
+                evidence_sets = [pack_context(chunks) for chunks in retrieved]
+            # one "evaluate"/"polish" span pair per policy; each worker thread
+            # runs in a copy of this context so its tags land on its own span
+            reports = list(pool.map(
+                lambda ev: contextvars.copy_context().run(
+                    _evaluate_and_polish, ev, incident_text, trace
+                ),
+                evidence_sets,
+            ))
+            # citations renumbered to the ranked list returned with the report
+            top_chunks, chunk_numbers = rank_policy_evidence(list(zip(labels, evidence_sets)))
+            result, _ = combine_policy_reports(list(zip(labels, reports)), chunk_numbers)
+            return incident_text, top_chunks, result
+
+    with trace.span("pack_context") as span:
+        top_chunks = pack_policy_context(list(zip(labels, retrieved)))
+        span.tags["chunks"] = len(top_chunks)
+    return incident_text, top_chunks, _evaluate_and_polish(top_chunks, incident_text, trace)
+
+
+def run_analysis(policy_pdf: Union[str, List[str]], incident_pdf: str):
+    """
+    policy_pdf: one policy PDF, or a list of them (see analyze_incident_multi).
+    """
+    policy_pdfs = [policy_pdf] if isinstance(policy_pdf, str) else list(policy_pdf)
+    trace = Trace("run_analysis", policies=len(policy_pdfs))
+
+    try:
+        if len(policy_pdfs) == 1:
+            with trace.span("vector_store"):
+                vs_id = get_or_create_vector_store(policy_pdfs[0])
+            incident_text, top_chunks, result = analyze_incident(
+                vs_id, incident_pdf, trace=trace
+            )
+        else:
+            with trace.span("vector_store"), \
+                    ThreadPoolExecutor(max_workers=len(policy_pdfs)) as pool:
+                vs_ids = list(pool.map(get_or_create_vector_store, policy_pdfs))
+            vs_id = ", ".join(vs_ids)
+            policies = [(os.path.basename(p), v) for p, v in zip(policy_pdfs, vs_ids)]
+            incident_text, top_chunks, result = analyze_incident_multi(
+                policies, incident_pdf, trace=trace
+            )
+    except BaseException:
+        trace.finish("error")
+        raise
+    trace.finish()
 
     print("\n" + "="*90)
     print("INCIDENT")
     print("="*90)
     print(incident_text)
 
-    vs_id = get_or_create_vector_store(policy_pdf)
     print(f"\nUsing vector store: {vs_id}")
 
-    top_chunks = retrieve_top_chunks(vs_id, incident_text, top_k=8)
-
     print("\n" + "="*90)
     print("TOP MATCHED POLICY CHUNKS")
     print("="*90)
@@ -594,9 +1502,6 @@ def run_analysis(policy_pdf: str, incident_pdf: str):
         print("-"*90)
         print(text)
 
-    result = evaluate_incident(top_chunks, incident_text)
-    #result = augment_missing_children_from_incident(incident_text, result)
-    result = polish_and_group_violations(result)
     print("\n" + "="*90)
     print("FINAL INCIDENT EVALUATION")
     print("="*90)
@@ -0,0 +1,355 @@
+# agent/job_queue.py
+#
+# Durable analysis job queue (SQLite, shared by the web backend and workers)
+# - submit(): admission control before anything is queued
+#     JOB_QUEUE_MAX queued jobs in total -> QueueFull (backpressure)
+#     JOB_USER_MAX_PENDING queued/running jobs per user -> UserLimitReached
+# - claim(): oldest queued job whose user has fewer than JOB_USER_CONCURRENCY
+#   jobs running; atomic across worker processes (BEGIN IMMEDIATE)
+# - Running jobs heartbeat; a job whose worker died (no heartbeat for
+#   JOB_STALE_SECONDS) is re-queued, up to JOB_MAX_ATTEMPTS
+# - Progress (evidence + streamed partial report) and results are rows in
+#   cache/jobs.sqlite, so they survive a backend restart; finished jobs are
+#   pruned after JOB_RETENTION_SECONDS
+# - Workers also report in (workers table): when they were last seen (the
+#   UI gives up on a job when no worker is alive) and their metrics
+#   snapshot, which the web backend serves at /_api/metrics
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+CACHE_DIR = "cache"
+JOB_QUEUE_FILE = os.path.join(CACHE_DIR, "jobs.sqlite")
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "50"))
+JOB_USER_MAX_PENDING = int(os.getenv("JOB_USER_MAX_PENDING", "3"))
+JOB_USER_CONCURRENCY = int(os.getenv("JOB_USER_CONCURRENCY", "1"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+# one connection per (thread, path); the schema is created once per path
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+class QueueFull(RuntimeError):
+    """Too many analyses waiting; try again later."""
+
+
+class UserLimitReached(RuntimeError):
+    """This user already has the maximum number of analyses queued/running."""
+
+
+@dataclass
+class Job:
+    id: str
+    user_id: str
+    status: str                     # queued / running / done / error
+    payload: Dict[str, Any]
+    progress: Dict[str, Any]        # {"top_chunks": [...], "report": "partial"}
+    result: Optional[Dict[str, Any]]
+    error: str
+    attempts: int
+    created_at: float
+    position: int = 0               # 1 = next to run (queued jobs only)
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " id TEXT UNIQUE NOT NULL,"
+        " user_id TEXT NOT NULL,"
+        " status TEXT NOT NULL,"
+        " payload TEXT NOT NULL,"
+        " progress TEXT NOT NULL DEFAULT '{}',"
+        " result TEXT,"
+        " error TEXT NOT NULL DEFAULT '',"
+        " attempts INTEGER NOT NULL DEFAULT 0,"
+        " worker TEXT,"
+        " created_at REAL NOT NULL,"
+        " heartbeat REAL,"
+        " finished_at REAL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, seq)")
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_user ON jobs(user_id, status)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS workers ("
+        " worker TEXT PRIMARY KEY,"
+        " seen REAL NOT NULL,"
+        " metrics TEXT NOT NULL DEFAULT '{}')"
+    )
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """
+    This thread's connection to path (opened once, then reused).
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is not None:
+        return conn
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    with _schema_lock:
+        if path not in _schema_ready:
+            _create_schema(conn)
+            _schema_ready.add(path)
+    conns[path] = conn
+    return conn
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue shared by threads and processes.
+    """
+
+    def __init__(
+        self,
+        path: str = JOB_QUEUE_FILE,
+        max_queued: int = JOB_QUEUE_MAX,
+        user_max_pending: int = JOB_USER_MAX_PENDING,
+        user_concurrency: int = JOB_USER_CONCURRENCY,
+    ):
+        self.path = path
+        self.max_queued = max_queued
+        self.user_max_pending = user_max_pending
+        self.user_concurrency = user_concurrency
+
+    def _run(self, fn):
+        # one short transaction; BEGIN IMMEDIATE serializes writers across
+        # threads and processes
+        conn = _connect(self.path)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            out = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return out
+
+    def submit(self, user_id: str, payload: Dict[str, Any]) -> str:
+        """
+        Queue one analysis. Raises QueueFull / UserLimitReached instead of
+        accepting work the workers cannot get to.
+        """
+        job_id = uuid.uuid4().hex
+
+        def tx(conn: sqlite3.Connection) -> None:
+            now = time.time()
+            conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (now - JOB_RETENTION_SECONDS,),
+            )
+            conn.execute(
+                "DELETE FROM workers WHERE seen < ?", (now - JOB_RETENTION_SECONDS,)
+            )
+            (queued,) = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+            ).fetchone()
+            if queued >= self.max_queued:
+                raise QueueFull(f"{queued} analyses are already waiting.")
+            (pending,) = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status IN ('queued', 'running')",
+                (user_id,),
+            ).fetchone()
+            if pending >= self.user_max_pending:
+                raise UserLimitReached(
+                    f"You already have {pending} analyses in progress."
+                )
+            conn.execute(
+                "INSERT INTO jobs (id, user_id, status, payload, created_at)"
+                " VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, user_id, json.dumps(payload, ensure_ascii=False), now),
+            )
+
+        self._run(tx)
+        return job_id
+
+    def _requeue_stale(self, conn: sqlite3.Connection, now: float) -> None:
+        stale = now - JOB_STALE_SECONDS
+        conn.execute(
+            "UPDATE jobs SET status = 'error', error = 'Worker lost (too many attempts).',"
+            " finished_at = ? WHERE status = 'running' AND heartbeat < ? AND attempts >= ?",
+            (now, stale, JOB_MAX_ATTEMPTS),
+        )
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, progress = '{}'"
+            " WHERE status = 'running' AND heartbeat < ?",
+            (stale,),
+        )
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """
+        Next runnable job (FIFO, skipping users at their concurrency limit),
+        marked running for `worker`. None if nothing is runnable.
+        """
+        def tx(conn: sqlite3.Connection) -> Optional[str]:
+            now = time.time()
+            self._requeue_stale(conn, now)
+            row = conn.execute(
+                "SELECT id FROM jobs AS j WHERE status = 'queued' AND ("
+                " SELECT COUNT(*) FROM jobs AS r"
+                " WHERE r.user_id = j.user_id AND r.status = 'running') < ?"
+                " ORDER BY seq LIMIT 1",
+                (self.user_concurrency,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, heartbeat = ?,"
+                " attempts = attempts + 1 WHERE id = ?",
+                (worker, now, row[0]),
+            )
+            return row[0]
+
+        job_id = self._run(tx)
+        return self.get(job_id) if job_id else None
+
+    def _update_running(self, job_id: str, worker: str, sql: str, args: tuple) -> bool:
+        # only the worker that holds the job may touch it (a re-queued job may
+        # already belong to someone else)
+        def tx(conn: sqlite3.Connection) -> bool:
+            cur = conn.execute(
+                f"UPDATE jobs SET {sql} WHERE id = ? AND worker = ? AND status = 'running'",
+                args + (job_id, worker),
+            )
+            return cur.rowcount > 0
+
+        return self._run(tx)
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        return self._update_running(job_id, worker, "heartbeat = ?", (time.time(),))
+
+    def set_progress(self, job_id: str, worker: str, progress: Dict[str, Any]) -> bool:
+        return self._update_running(
+            job_id, worker, "progress = ?, heartbeat = ?",
+            (json.dumps(progress, ensure_ascii=False), time.time()),
+        )
+
+    def complete(self, job_id: str, worker: str, result: Dict[str, Any]) -> bool:
+        return self._update_running(
+            job_id, worker, "status = 'done', result = ?, finished_at = ?",
+            (json.dumps(result, ensure_ascii=False), time.time()),
+        )
+
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        return self._update_running(
+            job_id, worker, "status = 'error', error = ?, finished_at = ?",
+            (error, time.time()),
+        )
+
+    def release(self, job_id: str, worker: str) -> bool:
+        """
+        Give a claimed job back (worker shutting down): queued again, and the
+        attempt is not counted against JOB_MAX_ATTEMPTS.
+        """
+        return self._update_running(
+            job_id, worker,
+            "status = 'queued', worker = NULL, progress = '{}',"
+            " attempts = MAX(attempts - 1, 0)",
+            (),
+        )
+
+    def cancel(self, job_id: str, error: str) -> bool:
+        """
+        Mark a queued / running job as failed (e.g. nobody is left to run it).
+        A worker still holding it can no longer update it.
+        """
+        def tx(conn: sqlite3.Connection) -> bool:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'error', error = ?, finished_at = ?"
+                " WHERE id = ? AND status IN ('queued', 'running')",
+                (error, time.time(), job_id),
+            )
+            return cur.rowcount > 0
+
+        return self._run(tx)
+
+    def report_worker(self, worker: str, metrics: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Mark `worker` as alive now; metrics: its METRICS.snapshot() (kept
+        from the last report when None).
+        """
+        def tx(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT INTO workers (worker, seen, metrics) VALUES (?, ?, ?)"
+                " ON CONFLICT(worker) DO UPDATE SET seen = excluded.seen,"
+                " metrics = CASE WHEN ? THEN excluded.metrics ELSE workers.metrics END",
+                (worker, time.time(), json.dumps(metrics or {}), metrics is not None),
+            )
+
+        self._run(tx)
+
+    def workers_alive(self, within: float = JOB_STALE_SECONDS) -> int:
+        """
+        Workers that reported in during the last `within` seconds.
+        """
+        (n,) = _connect(self.path).execute(
+            "SELECT COUNT(*) FROM workers WHERE seen >= ?", (time.time() - within,)
+        ).fetchone()
+        return n
+
+    def worker_metrics(self) -> List[Dict[str, Any]]:
+        """
+        Latest metrics snapshot of every worker that reported in (including
+        workers that have since exited: their counts still happened).
+        """
+        rows = _connect(self.path).execute("SELECT metrics FROM workers").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        The job with its current queue position; None if unknown / pruned.
+        """
+        conn = _connect(self.path)
+        row = conn.execute(
+            "SELECT seq, id, user_id, status, payload, progress, result, error,"
+            " attempts, created_at FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        seq, status = row[0], row[3]
+        position = 0
+        if status == "queued":
+            (ahead,) = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND seq < ?",
+                (seq,),
+            ).fetchone()
+            position = ahead + 1
+
+        return Job(
+            id=row[1],
+            user_id=row[2],
+            status=status,
+            payload=json.loads(row[4]),
+            progress=json.loads(row[5] or "{}"),
+            result=json.loads(row[6]) if row[6] else None,
+            error=row[7],
+            attempts=row[8],
+            created_at=row[9],
+            position=position,
+        )
+
+
+_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
@@ -0,0 +1,333 @@
+# agent/job_worker.py
+#
+# Worker pool that executes queued analyses (agent/job_queue.py)
+#   python -m agent.job_worker --workers 4
+# - One process per worker, one analysis at a time each: the pool size
+#   bounds concurrent analyses (and their memory), independent of how many
+#   sessions the web backend serves
+# - The Reflex backend starts a pool itself (ANALYSIS_WORKERS, see app/app.py);
+#   set ANALYSIS_WORKERS=0 to run pools separately with this command
+# - Progress (evidence, then the streamed report) is written back to the
+#   queue so the UI can follow a job from any backend process
+# - A worker that dies mid-job stops heartbeating; the job is re-queued
+#   (a worker stopped with SIGTERM re-queues its job itself, attempt refunded)
+# - After every job a worker stores its metrics snapshot in the queue
+
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import argparse
+import threading
+import subprocess
+import multiprocessing
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from agent.embedding_store import (
+    aget_or_create_vector_store,
+    aevaluate_incident,
+    astream_evaluate_incident,
+    parse_decision,
+    aload_document,
+    apolish_and_group_violations,
+    aevaluate_incident_structured,
+    aretrieve_policies,
+    aevaluate_per_policy,
+    run_cpu,
+    EVAL_MODE,
+    MULTI_POLICY_MODE,
+)
+from agent.context_packer import pack_context, pack_policy_context, rank_policy_evidence
+from agent.job_queue import Job, JobQueue, get_job_queue
+from agent.pdf_extract import shutdown_pool as shutdown_pdf_pool
+from agent.report_format import parse_report, render_report, report_to_dict
+from agent.tracing import METRICS, Trace
+
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+
+# Stream the evaluation into the results page (set STREAM_REPORT=0 to wait for the full report)
+STREAM_REPORT = os.getenv("STREAM_REPORT", "1").lower() not in ("0", "false", "no")
+
+
+class WorkerStopped(BaseException):
+    """SIGTERM in a worker: give the current job back and exit."""
+
+
+# --------------------------------------------------
+# One analysis
+# --------------------------------------------------
+
+async def aanalyze_job(
+    payload: Dict[str, Any],
+    on_progress: Callable[[Dict[str, Any]], Awaitable[None]],
+    trace: Trace,
+) -> Dict[str, Any]:
+    """
+    payload: policy_paths / policy_hashes / policy_names / incident_path /
+    incident_hash (as saved at upload time).
+    on_progress({"top_chunks": [...], "report": partial}) is awaited once the
+    evidence is known and for every streamed update.
+    Returns {"top_chunks", "report", "decision", "typed_report"}; typed_report
+    (report_to_dict) keeps what the text loses, e.g. per-policy title prefixes.
+    """
+    with trace.span("load_incident"):
+        incident_doc = await aload_document(
+            payload["incident_path"], file_hash=payload["incident_hash"]
+        )
+    incident_text = incident_doc.text
+
+    # Create / load vector stores for every policy (concurrently)
+    with trace.span("vector_store"):
+        vs_ids = await asyncio.gather(*(
+            aget_or_create_vector_store(path, file_hash=file_hash)
+            for path, file_hash in zip(payload["policy_paths"], payload["policy_hashes"])
+        ))
+
+    # Retrieve chunks from every store at once (one ranked list per policy)
+    with trace.span("retrieve", top_k=25):
+        per_policy = await aretrieve_policies(
+            list(vs_ids),
+            incident_text,
+            top_k=25,
+            target_queries=8,
+            per_query_k=6,
+            sentence_spans=incident_doc.sentence_spans,
+        )
+    labeled = list(zip(payload["policy_names"], per_policy))
+    per_policy_eval = len(labeled) > 1 and MULTI_POLICY_MODE == "per_policy"
+
+    # Fit the evidence to the prompt token budget; the UI shows the same
+    # list so "Rank N" matches the report's [Chunk N] citations (per_policy:
+    # each policy's citations are renumbered to this list)
+    chunk_numbers = None
+    with trace.span("pack_context") as span:
+        if per_policy_eval:
+            labeled = [(name, pack_context(chunks)) for name, chunks in labeled]
+            evidence, chunk_numbers = rank_policy_evidence(labeled)
+        elif len(labeled) > 1:
+            evidence = pack_policy_context(labeled)
+        else:
+            evidence = pack_context(per_policy[0])
+        span.tags["chunks"] = len(evidence)
+
+    # Show top 10 in UI
+    top10 = []
+    for score, chunk_text in evidence[:10]:
+        top10.append({"score": f"{float(score):.4f}", "chunk": str(chunk_text)})
+
+    streaming = STREAM_REPORT and EVAL_MODE != "structured" and not per_policy_eval
+
+    if per_policy_eval:
+        # One evaluation per policy, all in flight together
+        with trace.span("evaluate", mode="per_policy"):
+            report, result = await aevaluate_per_policy(labeled, incident_text, chunk_numbers)
+        decision = result.decision
+    elif EVAL_MODE == "structured":
+        # One JSON-schema call -> typed report (no polish round trip)
+        with trace.span("evaluate", mode="structured"):
+            result = await aevaluate_incident_structured(evidence, incident_text)
+        report = render_report(result)
+        decision = result.decision
+    else:
+        if streaming:
+            # Show evidence + partial report as soon as tokens arrive
+            await on_progress({"top_chunks": top10, "report": ""})
+
+            report = ""
+            with trace.span("evaluate", mode="stream"):
+                async for partial in astream_evaluate_incident(evidence, incident_text):
+                    report = partial
+                    await on_progress({"top_chunks": top10, "report": partial})
+        else:
+            with trace.span("evaluate", mode="text"):
+                report = await aevaluate_incident(evidence, incident_text)
+
+        with trace.span("polish"):
+            report = await apolish_and_group_violations(report)
+        with trace.span("parse"):
+            decision = parse_decision(report)
+            result = parse_report(report)
+
+    return {
+        "top_chunks": top10,
+        "report": report,
+        "decision": decision,
+        "typed_report": report_to_dict(result),
+    }
+
+
+def _heartbeat(queue: JobQueue, job_id: str, worker: str, stop: threading.Event) -> None:
+    while not stop.wait(JOB_HEARTBEAT_SECONDS):
+        queue.heartbeat(job_id, worker)
+        queue.report_worker(worker)
+
+
+def run_job(
+    queue: JobQueue,
+    job: Job,
+    worker: str,
+    loop: asyncio.AbstractEventLoop,
+) -> None:
+    """
+    Execute one claimed job and record its result (or error) in the queue.
+    loop: the worker's event loop (reused: the async API client binds to it).
+    """
+    trace = Trace("job", job_id=job.id, attempt=job.attempts)
+    stop = threading.Event()
+    beat = threading.Thread(
+        target=_heartbeat, args=(queue, job.id, worker, stop), daemon=True
+    )
+    beat.start()
+
+    async def on_progress(progress: Dict[str, Any]) -> None:
+        await run_cpu(queue.set_progress, job.id, worker, progress)
+
+    try:
+        result = loop.run_until_complete(aanalyze_job(job.payload, on_progress, trace))
+        trace.finish()
+        result["stage_timings"] = trace.summary()
+        queue.complete(job.id, worker, result)
+        print(f"[run_job] {job.id} done ({result['decision']}).")
+    except Exception as e:
+        trace.finish("error")
+        queue.fail(job.id, worker, f"{type(e).__name__}: {e}")
+        print(f"[run_job] {job.id} failed: {type(e).__name__}: {e}")
+    except BaseException:
+        # shutdown (SIGTERM / Ctrl-C): re-queue now instead of after
+        # JOB_STALE_SECONDS, without using up one of the job's attempts
+        trace.finish("interrupted")
+        queue.release(job.id, worker)
+        print(f"[run_job] {job.id} interrupted; returned to the queue.")
+        raise
+    finally:
+        stop.set()
+
+
+# --------------------------------------------------
+# Workers / pool
+# --------------------------------------------------
+
+def worker_loop(
+    poll_seconds: float = JOB_POLL_SECONDS,
+    max_jobs: Optional[int] = None,
+    parent_pid: Optional[int] = None,
+) -> int:
+    """
+    Claim and run jobs until interrupted (or max_jobs have run, or the
+    parent_pid process is gone).
+    Returns the number of jobs run.
+    """
+    queue = get_job_queue()
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    loop = asyncio.new_event_loop()
+    queue.report_worker(worker, METRICS.snapshot())
+    last_report = time.time()
+    print(f"[worker_loop] {worker} waiting for jobs.")
+    done = 0
+    try:
+        while max_jobs is None or done < max_jobs:
+            if parent_pid is not None and os.getppid() != parent_pid:
+                print(f"[worker_loop] {worker} lost its pool; exiting.")
+                break
+            job = queue.claim(worker)
+            if job is None:
+                # idle workers still report in (liveness for waiting sessions)
+                if time.time() - last_report >= JOB_HEARTBEAT_SECONDS:
+                    queue.report_worker(worker)
+                    last_report = time.time()
+                time.sleep(poll_seconds)
+                continue
+            run_job(queue, job, worker, loop)
+            done += 1
+            # this process's metrics, for the web backend's /_api/metrics
+            queue.report_worker(worker, METRICS.snapshot())
+            last_report = time.time()
+    finally:
+        loop.close()
+    return done
+
+
+def _stop_worker(*_) -> None:
+    # one stop is enough; a second SIGTERM must not interrupt the release
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise WorkerStopped()
+
+
+def _worker_main(parent_pid: int) -> None:
+    signal.signal(signal.SIGTERM, _stop_worker)
+    try:
+        worker_loop(parent_pid=parent_pid)
+    except (KeyboardInterrupt, WorkerStopped):
+        # any job is back in the queue: exit without waiting for in-flight
+        # model calls (or finalizing the abandoned analysis), but never leave
+        # PDF extraction processes behind
+        shutdown_pdf_pool()
+        sys.stdout.flush()
+        os._exit(0)
+
+
+def run_pool(workers: int = ANALYSIS_WORKERS) -> None:
+    """
+    Run `workers` worker processes until interrupted / terminated.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    # not daemonic: workers start their own PDF extraction pool
+    # (agent/pdf_extract.py); they are terminated and joined below
+    procs = [
+        ctx.Process(target=_worker_main, args=(os.getpid(),), daemon=False)
+        for _ in range(max(1, workers))
+    ]
+    for p in procs:
+        p.start()
+    print(f"[run_pool] {len(procs)} analysis workers started.")
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # workers hand their running jobs back before exiting
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.join(timeout=5)
+
+
+def start_worker_pool(workers: int = ANALYSIS_WORKERS) -> Optional[subprocess.Popen]:
+    """
+    Launch the pool as a child process of the caller (the web backend).
+    None when workers <= 0 (pools run elsewhere).
+    """
+    if workers <= 0:
+        return None
+    return subprocess.Popen(
+        [sys.executable, "-m", "agent.job_worker", "--workers", str(workers)]
+    )
+
+
+def stop_worker_pool(proc: Optional[subprocess.Popen], timeout: float = 10) -> None:
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run queued incident analyses.")
+    parser.add_argument("-w", "--workers", type=int, default=ANALYSIS_WORKERS)
+    args = parser.parse_args(argv)
+    # terminate() from the web backend -> clean shutdown of the workers too
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    run_pool(args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+# agent/lexical_index.py
+#
+# Local BM25 inverted index over policy chunks (zero-network retrieval)
+# - Built once per policy at ingest, from the same sentence windows as the
+#   local vector index
+# - Compact posting lists: one flat int32 doc-id array + uint16 term
+#   frequencies, sliced per term via an offsets array (6 bytes per posting)
+# - Scoring touches only the postings of the query's terms (numpy, no Python
+#   loop over documents)
+# - Scores are reported as BM25 / its maximum for the query, (k1 + 1) * sum
+#   of the query terms' idf, so they lie in [0, 1): ~0.4 = an average-length
+#   chunk containing every query term once; a chunk with 2 of 6 equally rare
+#   terms scores ~0.13 (used by the LEXICAL_PREFILTER_MIN threshold)
+# - Persisted next to the other cache artifacts as:
+#     cache/bm25_<hash>.npz   (postings, doc lengths)
+#     cache/bm25_<hash>.json  (vocabulary + chunk text)
+
+import os
+import re
+import json
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+CACHE_DIR = "cache"
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Function words carry no policy signal and dilute the [0, 1] score
+STOPWORDS = frozenset(
+    "a an and are as at be been by for from has have in into is it its of on "
+    "or that the their this to was were which will with".split()
+)
+
+# Loaded indexes (policy_hash -> BM25Index), one per process
+_LOADED: Dict[str, "BM25Index"] = {}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def _postings_path(policy_hash: str) -> str:
+    return os.path.join(CACHE_DIR, f"bm25_{policy_hash}.npz")
+
+
+def _vocab_path(policy_hash: str) -> str:
+    return os.path.join(CACHE_DIR, f"bm25_{policy_hash}.json")
+
+
+class BM25Index:
+    """
+    Read-only BM25 index over one policy's chunks.
+    - vocab: term -> row; postings of row i are doc_ids/tfs[offsets[i]:offsets[i+1]]
+    - chunks: chunk text per doc id
+    """
+
+    def __init__(
+        self,
+        vocab: List[str],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+        chunks: List[str],
+    ):
+        if doc_len.shape[0] != len(chunks):
+            raise ValueError(
+                f"Index has {doc_len.shape[0]} documents but {len(chunks)} chunks."
+            )
+        self.vocab = {term: i for i, term in enumerate(vocab)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.chunks = chunks
+
+        n = len(chunks)
+        df = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(doc_len.mean()) if n else 1.0
+        # per-document part of the BM25 denominator
+        self._norm = (
+            BM25_K1 * (1 - BM25_B + BM25_B * doc_len / max(avgdl, 1e-6))
+        ).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def _score(self, query: str) -> Tuple[np.ndarray, float]:
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        max_score = 0.0
+        for term in set(tokenize(query)):
+            i = self.vocab.get(term)
+            if i is None:
+                continue
+            lo, hi = self.offsets[i], self.offsets[i + 1]
+            ids = self.doc_ids[lo:hi]
+            tf = self.tfs[lo:hi].astype(np.float32)
+            # doc ids are unique within a posting list -> plain fancy-index add
+            scores[ids] += self.idf[i] * tf * (BM25_K1 + 1) / (tf + self._norm[ids])
+            # each term contributes less than (k1 + 1) * idf, however often it occurs
+            max_score += (BM25_K1 + 1) * float(self.idf[i])
+        return scores, max_score
+
+    def search(self, queries: List[str], k: int) -> List[List[Tuple[float, str]]]:
+        """
+        One [(score, chunk_text), ...] list per query, best first; only chunks
+        sharing at least one term with the query. score in [0, 1): BM25 over
+        the query's maximum achievable score.
+        """
+        out: List[List[Tuple[float, str]]] = []
+        for query in queries:
+            scores, max_score = self._score(query)
+            if max_score <= 0 or not len(scores):
+                out.append([])
+                continue
+
+            kk = max(1, min(k, scores.shape[0]))
+            if kk < scores.shape[0]:
+                idx = np.argpartition(-scores, kk - 1)[:kk]
+            else:
+                idx = np.arange(scores.shape[0])
+            idx = idx[scores[idx] > 0]
+            # stable: ties keep chunk order
+            order = np.lexsort((idx, -scores[idx]))
+            out.append([
+                (float(scores[idx[j]]) / max_score, self.chunks[int(idx[j])])
+                for j in order
+            ])
+        return out
+
+
+def build_bm25_index(chunks: List[str]) -> BM25Index:
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    doc_len = np.zeros(len(chunks), dtype=np.float32)
+    for doc_id, chunk in enumerate(chunks):
+        counts = Counter(tokenize(chunk))
+        doc_len[doc_id] = sum(counts.values())
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc_id, tf))
+
+    vocab = sorted(postings)
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    for i, term in enumerate(vocab):
+        offsets[i + 1] = offsets[i] + len(postings[term])
+
+    doc_ids = np.empty(int(offsets[-1]), dtype=np.int32)
+    tfs = np.empty(int(offsets[-1]), dtype=np.uint16)
+    for i, term in enumerate(vocab):
+        lo, hi = offsets[i], offsets[i + 1]
+        doc_ids[lo:hi] = [d for d, _ in postings[term]]
+        tfs[lo:hi] = [min(tf, 65535) for _, tf in postings[term]]
+
+    return BM25Index(vocab, offsets, doc_ids, tfs, doc_len, chunks)
+
+
+def bm25_index_exists(policy_hash: str) -> bool:
+    return os.path.exists(_postings_path(policy_hash)) and os.path.exists(
+        _vocab_path(policy_hash)
+    )
+
+
+def save_bm25_index(policy_hash: str, chunks: List[str]) -> BM25Index:
+    """
+    Build + persist the index for one policy (temp files + rename, like the
+    local vector index).
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    index = build_bm25_index(chunks)
+
+    postings_path = _postings_path(policy_hash)
+    vocab_path = _vocab_path(policy_hash)
+
+    tmp_postings = postings_path + ".tmp"
+    with open(tmp_postings, "wb") as f:
+        np.savez(
+            f,
+            offsets=index.offsets,
+            doc_ids=index.doc_ids,
+            tfs=index.tfs,
+            doc_len=index.doc_len,
+        )
+
+    tmp_vocab = vocab_path + ".tmp"
+    with open(tmp_vocab, "w", encoding="utf-8") as f:
+        vocab = sorted(index.vocab, key=index.vocab.get)
+        json.dump({"vocab": vocab, "chunks": chunks}, f, ensure_ascii=False)
+
+    os.replace(tmp_vocab, vocab_path)
+    os.replace(tmp_postings, postings_path)
+
+    _LOADED[policy_hash] = index
+    return index
+
+
+def load_bm25_index(policy_hash: str) -> Optional[BM25Index]:
+    """
+    Load a persisted index (cached per process).
+    Returns None if the policy has no lexical index yet.
+    """
+    index = _LOADED.get(policy_hash)
+    if index is not None:
+        return index
+
+    if not bm25_index_exists(policy_hash):
+        return None
+
+    with np.load(_postings_path(policy_hash)) as data:
+        arrays = {name: data[name] for name in ("offsets", "doc_ids", "tfs", "doc_len")}
+    with open(_vocab_path(policy_hash), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    index = BM25Index(meta["vocab"], chunks=meta["chunks"], **arrays)
+    _LOADED[policy_hash] = index
+    return index
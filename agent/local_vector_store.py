@@ -0,0 +1,173 @@
+# agent/local_vector_store.py
+#
+# Local in-process vector search (alternative to OpenAI vector stores)
+# - Policy chunk embeddings live in one contiguous float32 matrix
+# - Rows are L2-normalized, so cosine similarity == dot product
+# - All query chunks of one analysis are scored with ONE matrix multiply
+# - Persisted next to the other cache artifacts as:
+#     cache/policy_index_<hash>.npy          (memory-mapped on load)
+#     cache/policy_index_<hash>.chunks.jsonl (chunk text, one per row)
+
+import os
+import json
+from typing import List, Tuple, Dict, Optional
+
+import numpy as np
+
+CACHE_DIR = "cache"
+
+# Loaded indexes (policy_hash -> LocalVectorIndex), one per process
+_LOADED: Dict[str, "LocalVectorIndex"] = {}
+
+
+def _matrix_path(policy_hash: str) -> str:
+    return os.path.join(CACHE_DIR, f"policy_index_{policy_hash}.npy")
+
+
+def _chunks_path(policy_hash: str) -> str:
+    return os.path.join(CACHE_DIR, f"policy_index_{policy_hash}.chunks.jsonl")
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    if matrix.ndim != 2:
+        raise ValueError(f"Expected a (rows, dim) matrix, got shape {matrix.shape}.")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LocalVectorIndex:
+    """
+    Read-only view over one policy's chunk embeddings.
+    - matrix: (n_chunks, dim) float32, rows L2-normalized
+    - chunks: chunk text for each matrix row
+    """
+
+    def __init__(self, matrix: np.ndarray, chunks: List[str]):
+        if matrix.shape[0] != len(chunks):
+            raise ValueError(
+                f"Index has {matrix.shape[0]} vectors but {len(chunks)} chunks."
+            )
+        self.matrix = matrix
+        self.chunks = chunks
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(
+        self,
+        query_vectors: List[List[float]],
+        k: int,
+    ) -> List[List[Tuple[float, str]]]:
+        """
+        Score every query against every chunk in one batched matmul.
+        Returns one [(score, chunk_text), ...] list per query, best first.
+        """
+        if not query_vectors or not len(self.chunks):
+            return [[] for _ in query_vectors]
+
+        q = _normalize_rows(np.asarray(query_vectors, dtype=np.float32))
+        if q.shape[1] != self.matrix.shape[1]:
+            raise ValueError(
+                f"Query dim {q.shape[1]} != index dim {self.matrix.shape[1]} "
+                "(embedding model changed? rebuild the local index)."
+            )
+        scores = q @ self.matrix.T  # (n_queries, n_chunks)
+
+        k = max(1, min(k, scores.shape[1]))
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+
+        out: List[List[Tuple[float, str]]] = []
+        for row, idx in enumerate(top):
+            row_scores = scores[row, idx]
+            # stable: ties keep chunk order
+            order = np.lexsort((idx, -row_scores))
+            out.append([
+                (float(row_scores[j]), self.chunks[int(idx[j])])
+                for j in order
+            ])
+        return out
+
+
+def local_index_exists(policy_hash: str) -> bool:
+    return os.path.exists(_matrix_path(policy_hash)) and os.path.exists(
+        _chunks_path(policy_hash)
+    )
+
+
+def save_local_index(
+    policy_hash: str,
+    chunks: List[str],
+    embeddings: List[List[float]],
+) -> LocalVectorIndex:
+    """
+    Normalize + persist the embedding matrix and chunk texts.
+    Files are written to a temp name and renamed, so readers never see
+    a half-written index.
+    """
+    if not chunks or not embeddings:
+        raise ValueError(
+            "Policy has no text chunks to index (no extractable text in the PDF?)."
+        )
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    matrix = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+
+    matrix_path = _matrix_path(policy_hash)
+    chunks_path = _chunks_path(policy_hash)
+
+    tmp_matrix = matrix_path + ".tmp"
+    with open(tmp_matrix, "wb") as f:
+        np.save(f, matrix)
+
+    tmp_chunks = chunks_path + ".tmp"
+    with open(tmp_chunks, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(json.dumps({"chunk": chunk}, ensure_ascii=False) + "\n")
+
+    os.replace(tmp_chunks, chunks_path)
+    os.replace(tmp_matrix, matrix_path)
+
+    _LOADED.pop(policy_hash, None)
+    return load_local_index(policy_hash)
+
+
+def load_local_index(policy_hash: str) -> Optional[LocalVectorIndex]:
+    """
+    Memory-map a persisted index (cached per process).
+    Returns None if the policy has not been indexed yet.
+    """
+    index = _LOADED.get(policy_hash)
+    if index is not None:
+        return index
+
+    if not local_index_exists(policy_hash):
+        return None
+
+    matrix = np.load(_matrix_path(policy_hash), mmap_mode="r")
+    with open(_chunks_path(policy_hash), "r", encoding="utf-8") as f:
+        chunks = [json.loads(line)["chunk"] for line in f if line.strip()]
+
+    index = LocalVectorIndex(matrix, chunks)
+    _LOADED[policy_hash] = index
+    return index
+
+
+def load_legacy_embeddings(path: str) -> Tuple[List[str], List[List[float]]]:
+    """
+    Read the older cache/policy_embeddings.jsonl format:
+      {"chunk": "...", "embedding": [...]}
+    """
+    chunks: List[str] = []
+    embeddings: List[List[float]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            chunks.append(row["chunk"])
+            embeddings.append(row["embedding"])
+    return chunks, embeddings
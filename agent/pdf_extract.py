@@ -0,0 +1,81 @@
+# agent/pdf_extract.py
+#
+# Parallel PDF page extraction for large policy manuals
+# - Page ranges are sharded across a process pool (text extraction is CPU-bound)
+# - Each worker opens its own PdfReader; results are reassembled in page order
+# - Kept free of heavy imports so spawned workers start quickly
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 2)))
+
+# Below this many pages, extraction stays single-process
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", "40"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: safe to start from a threaded parent (the Reflex backend)
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """
+    Stop the extraction processes (e.g. before os._exit); shards already
+    running finish first, queued ones are dropped.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def extract_page_range(path: str, start: int, end: int) -> List[str]:
+    """
+    Extract text for pages [start, end) of one PDF (runs in a worker process).
+    """
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def page_ranges(n_pages: int, n_shards: int) -> List[Tuple[int, int]]:
+    """
+    Split [0, n_pages) into n_shards contiguous, near-equal ranges.
+    """
+    n_shards = max(1, min(n_shards, n_pages))
+    size, extra = divmod(n_pages, n_shards)
+    ranges: List[Tuple[int, int]] = []
+    start = 0
+    for i in range(n_shards):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def extract_pages_parallel(path: str, n_pages: int, workers: int = PDF_WORKERS) -> List[str]:
+    """
+    Page texts in page order, extracted across the process pool.
+    Uses ~2 shards per worker so one slow range doesn't hold up the rest.
+    """
+    pool = _get_pool()
+    ranges = page_ranges(n_pages, workers * 2)
+    futures = [pool.submit(extract_page_range, path, s, e) for s, e in ranges]
+
+    pages: List[str] = []
+    for fut in futures:
+        pages.extend(fut.result())
+    return pages
@@ -0,0 +1,453 @@
+# agent/report_format.py
+#
+# Parser / renderer for the evaluator's text format:
+#
+#   Decision: Violation
+#
+#   A) <Parent title>
+#   - Evidence:
+#     - [Chunk 3] "<policy sentence>"
+#   - Additional evidence:
+#     - [Chunk 5] "<policy sentence>"
+#   - Children:
+#     - A1) Incident fact: "<...>"
+#          Why: <...>
+#
+# Used by the local grouper: merges parents whose normalized Evidence
+# sentences match, keeps [Chunk #] tags verbatim, renumbers A1/A2/...
+# and re-renders the same format (no LLM round trip).
+#
+# The same dataclasses are the typed result of the structured (JSON schema)
+# evaluation mode: see EVALUATION_SCHEMA / report_from_json.
+
+import re
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Dict, Any, Tuple
+
+DECISIONS = ("Violation", "No violation", "Not enough policy evidence")
+
+_DECISION_RE = re.compile(r"^\s*\**\s*Decision\s*:\s*\**\s*(.+?)\s*\**\s*$", re.IGNORECASE)
+_PARENT_RE = re.compile(r"^\s*\**\s*([A-Z])\)\s*(.+?)\s*\**\s*$")
+_SECTION_RE = re.compile(r"^\s*-\s*\**\s*(Evidence|Additional evidence|Children)\b[^:]*:\s*\**\s*(.*)$", re.IGNORECASE)
+_EVIDENCE_RE = re.compile(r"^\s*-\s*\[Chunk\s*(\d+)\]\s*(.+?)\s*$", re.IGNORECASE)
+_CHILD_RE = re.compile(r"^\s*-\s*[A-Z]\d+\)\s*Incident fact\s*:\s*(.+?)\s*$", re.IGNORECASE)
+_WHY_RE = re.compile(r"^\s*Why\s*:\s*(.+?)\s*$", re.IGNORECASE)
+# Non-indented "Heading:" line after the parent blocks (e.g. "Unmapped incident actions:")
+_HEADING_RE = re.compile(r"^[^\s-][^:]*:\s*\**\s*$")
+_CITATION_RE = re.compile(r"\[Chunk\s*(\d+)\]", re.IGNORECASE)
+
+
+@dataclass
+class Evidence:
+    chunk: Optional[int]   # 1-based [Chunk N] index into the prompt excerpts
+    quote: str             # quoted policy sentence, including its quotes
+
+    def render(self) -> str:
+        if self.chunk is None:
+            return self.quote
+        return f"[Chunk {self.chunk}] {self.quote}"
+
+
+@dataclass
+class Child:
+    fact: str              # quoted incident fact, including its quotes
+    why: str = ""
+
+
+@dataclass
+class Parent:
+    title: str
+    evidence: List[Evidence] = field(default_factory=list)
+    additional_evidence: List[Evidence] = field(default_factory=list)
+    children: List[Child] = field(default_factory=list)
+
+
+@dataclass
+class EvaluationReport:
+    decision: str
+    parents: List[Parent] = field(default_factory=list)
+    # Lines that are not part of a parent block (e.g. "Unmapped incident actions",
+    # or the whole body of a No violation / Not enough evidence report)
+    trailing: List[str] = field(default_factory=list)
+    # Structured mode only (text reports keep these in `trailing`)
+    reason: str = ""
+    unmapped: List[str] = field(default_factory=list)
+
+
+def _norm_decision(raw: str) -> str:
+    low = raw.strip().strip("<>").lower()
+    for d in DECISIONS:
+        if low.startswith(d.lower()):
+            return d
+    return raw.strip()
+
+
+def normalize_sentence(text: str) -> str:
+    """
+    Comparison key for evidence/fact sentences: no quotes, case, or extra spaces.
+    """
+    text = text.strip().strip('"“”\'').lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def parse_report(text: str) -> EvaluationReport:
+    """
+    Parse evaluator output into an EvaluationReport.
+    - Inside a parent block, other non-blank lines are wrapped continuations
+      of the line before (title, evidence quote, fact or Why)
+    - A parent block ends at the next parent, a Decision line or a
+      non-indented "Heading:" line; lines outside blocks are kept in `trailing`
+    """
+    decision = ""
+    parents: List[Parent] = []
+    trailing: List[str] = []
+
+    current: Optional[Parent] = None
+    section = ""
+
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+
+        m = _DECISION_RE.match(line)
+        if m and not decision:
+            decision = _norm_decision(m.group(1))
+            continue
+        if m or _HEADING_RE.match(line):
+            current = None
+            section = ""
+
+        m = _PARENT_RE.match(line)
+        if m and decision == "Violation":
+            current = Parent(title=m.group(2).strip())
+            parents.append(current)
+            section = ""
+            continue
+
+        if current is not None:
+            m = _SECTION_RE.match(line)
+            if m:
+                section = m.group(1).lower()
+                continue
+
+            if section in ("evidence", "additional evidence"):
+                m = _EVIDENCE_RE.match(line)
+                if m:
+                    ev = Evidence(chunk=int(m.group(1)), quote=m.group(2))
+                    if section == "evidence":
+                        current.evidence.append(ev)
+                    else:
+                        current.additional_evidence.append(ev)
+                    continue
+
+            if section == "children":
+                m = _CHILD_RE.match(line)
+                if m:
+                    current.children.append(Child(fact=m.group(1)))
+                    continue
+                m = _WHY_RE.match(line)
+                if m and current.children:
+                    current.children[-1].why = m.group(1)
+                    continue
+
+            if _continue_line(current, section, line.strip()):
+                continue
+
+        trailing.append(line.rstrip())
+
+    return EvaluationReport(decision=decision, parents=parents, trailing=trailing)
+
+
+def _continue_line(parent: Parent, section: str, text: str) -> bool:
+    # append a wrapped line to the last item of the open section
+    if section == "children" and parent.children:
+        child = parent.children[-1]
+        if child.why:
+            child.why = f"{child.why} {text}"
+        else:
+            child.fact = f"{child.fact} {text}"
+        return True
+    evidence = {
+        "evidence": parent.evidence,
+        "additional evidence": parent.additional_evidence,
+    }.get(section)
+    if evidence:
+        evidence[-1].quote = f"{evidence[-1].quote} {text}"
+        return True
+    if not section:
+        parent.title = f"{parent.title} {text}"
+        return True
+    return False
+
+
+def group_parents(report: EvaluationReport) -> EvaluationReport:
+    """
+    Merge parents whose primary Evidence sentences normalize to the same text.
+    - First parent keeps its title and primary Evidence (chunk tag untouched)
+    - Distinct evidence from merged parents moves to Additional evidence
+    - Children are concatenated (exact duplicate facts dropped)
+    """
+    merged: List[Parent] = []
+    by_key = {}
+
+    for parent in report.parents:
+        key = normalize_sentence(parent.evidence[0].quote) if parent.evidence else None
+        target = by_key.get(key) if key else None
+
+        if target is None:
+            merged.append(parent)
+            if key:
+                by_key[key] = parent
+            continue
+
+        seen = {normalize_sentence(e.quote) for e in target.evidence + target.additional_evidence}
+        for ev in parent.evidence + parent.additional_evidence:
+            k = normalize_sentence(ev.quote)
+            if k not in seen:
+                target.additional_evidence.append(ev)
+                seen.add(k)
+
+        facts = {normalize_sentence(c.fact) for c in target.children}
+        for child in parent.children:
+            k = normalize_sentence(child.fact)
+            if k not in facts:
+                target.children.append(child)
+                facts.add(k)
+
+    return EvaluationReport(
+        decision=report.decision,
+        parents=merged,
+        trailing=report.trailing,
+        reason=report.reason,
+        unmapped=report.unmapped,
+    )
+
+
+def render_report(report: EvaluationReport) -> str:
+    """
+    Render back to the evaluator's text format, renumbering A/B/... and A1/A2/...
+    """
+    lines = [f"Decision: {report.decision}"]
+
+    if report.decision == "No violation" and report.reason:
+        lines.append(f"- Why: {report.reason}")
+        first = report.parents[0] if report.parents else None
+        if first is not None and first.evidence:
+            lines.append("- Evidence:")
+            lines.extend(f"  - {ev.render()}" for ev in first.evidence)
+        if first is not None and first.children:
+            lines.append("- Incident fact:")
+            lines.extend(f"  - {c.fact}" for c in first.children)
+        return "\n".join(lines + report.trailing).strip()
+
+    if report.decision == "Not enough policy evidence" and report.reason:
+        lines.append(f"- Reason: {report.reason}")
+        return "\n".join(lines + report.trailing).strip()
+
+    for p_idx, parent in enumerate(report.parents):
+        letter = chr(ord("A") + p_idx) if p_idx < 26 else f"P{p_idx + 1}"
+        lines.append("")
+        lines.append(f"{letter}) {parent.title}")
+        if parent.evidence:
+            lines.append("- Evidence:")
+            lines.extend(f"  - {ev.render()}" for ev in parent.evidence)
+        if parent.additional_evidence:
+            lines.append("- Additional evidence:")
+            lines.extend(f"  - {ev.render()}" for ev in parent.additional_evidence)
+        if parent.children:
+            lines.append("- Children:")
+            for c_idx, child in enumerate(parent.children, 1):
+                lines.append(f"  - {letter}{c_idx}) Incident fact: {child.fact}")
+                if child.why:
+                    lines.append(f"       Why: {child.why}")
+
+    if report.unmapped:
+        lines.append("")
+        lines.append("Unmapped incident actions:")
+        lines.extend(f"- {action}" for action in report.unmapped)
+
+    if report.trailing:
+        lines.append("")
+        lines.extend(report.trailing)
+
+    return "\n".join(lines).strip()
+
+
+def group_violations_locally(final_eval_text: str) -> str:
+    """
+    Deterministic stand-in for polish_and_group_violations.
+    Returns the input unchanged if it is not a parseable Violation report.
+    """
+    report = parse_report(final_eval_text)
+    if report.decision != "Violation" or not report.parents:
+        return final_eval_text.strip()
+    return render_report(group_parents(report))
+
+
+# --------------------------------------------------
+# Structured (JSON schema) evaluation output
+# --------------------------------------------------
+
+_EVIDENCE_SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "properties": {
+        "chunk": {"type": "integer", "description": "N from the [Chunk N] the quote came from"},
+        "quote": {"type": "string", "description": "One exact policy sentence, verbatim, without surrounding quotes"},
+    },
+    "required": ["chunk", "quote"],
+}
+
+EVALUATION_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "additionalProperties": False,
+    "properties": {
+        "decision": {"type": "string", "enum": list(DECISIONS)},
+        "parents": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "additionalProperties": False,
+                "properties": {
+                    "title": {"type": "string", "description": "Parent short title (max 8 words)"},
+                    "evidence": {"type": "array", "items": _EVIDENCE_SCHEMA},
+                    "additional_evidence": {"type": "array", "items": _EVIDENCE_SCHEMA},
+                    "children": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "additionalProperties": False,
+                            "properties": {
+                                "incident_fact": {"type": "string", "description": "3-12 words copied verbatim from the incident"},
+                                "why": {"type": "string", "description": "1 sentence linking the fact to the evidence"},
+                            },
+                            "required": ["incident_fact", "why"],
+                        },
+                    },
+                },
+                "required": ["title", "evidence", "additional_evidence", "children"],
+            },
+        },
+        "unmapped_actions": {"type": "array", "items": {"type": "string"}},
+        "reason": {"type": "string", "description": "Why (No violation) or Reason (Not enough policy evidence); empty for Violation"},
+    },
+    "required": ["decision", "parents", "unmapped_actions", "reason"],
+}
+
+# Responses API `text.format` for EVALUATION_SCHEMA
+EVALUATION_FORMAT: Dict[str, Any] = {
+    "type": "json_schema",
+    "name": "incident_evaluation",
+    "schema": EVALUATION_SCHEMA,
+    "strict": True,
+}
+
+
+def renumber_citations(text: str, numbers: Dict[int, int]) -> str:
+    """
+    Rewrite [Chunk N] as [Chunk numbers[N]]; citations not in numbers are kept.
+    """
+    def sub(m: re.Match) -> str:
+        n = numbers.get(int(m.group(1)))
+        return m.group(0) if n is None else f"[Chunk {n}]"
+
+    return _CITATION_RE.sub(sub, text)
+
+
+def combine_policy_reports(
+    labeled: List[Tuple[str, str]],
+    chunk_numbers: Optional[List[Dict[int, int]]] = None,
+) -> Tuple[str, EvaluationReport]:
+    """
+    Combine per-policy report texts ([(policy_label, report), ...]).
+    - Overall decision: the first of DECISIONS that any policy reached
+    - Text: overall Decision line, then each policy's report under a header
+    - Typed report: every Violation parent, titles prefixed with "[label]"
+    - chunk_numbers: per policy, its [Chunk N] -> number in the combined
+      evidence list (rank_policy_evidence); each policy's citations restart
+      at 1 otherwise
+    """
+    if chunk_numbers is not None:
+        labeled = [
+            (label, renumber_citations(text, numbers))
+            for (label, text), numbers in zip(labeled, chunk_numbers)
+        ]
+    parsed = [(label, parse_report(text)) for label, text in labeled]
+    reached = {report.decision for _, report in parsed}
+    decision = next((d for d in DECISIONS if d in reached), DECISIONS[-1])
+
+    parents: List[Parent] = []
+    for label, report in parsed:
+        if report.decision != "Violation":
+            continue
+        for parent in report.parents:
+            parents.append(Parent(
+                title=f"[{label}] {parent.title}",
+                evidence=parent.evidence,
+                additional_evidence=parent.additional_evidence,
+                children=parent.children,
+            ))
+
+    sections = [f"Decision: {decision}"]
+    for label, text in labeled:
+        sections.append(f"=== Policy: {label} ===\n{text.strip()}")
+    return "\n\n".join(sections), EvaluationReport(decision=decision, parents=parents)
+
+
+def _quoted(text: str) -> str:
+    text = text.strip()
+    if text.startswith('"') and text.endswith('"') and len(text) > 1:
+        return text
+    return f'"{text}"'
+
+
+def report_from_json(data: Dict[str, Any]) -> EvaluationReport:
+    """
+    Typed EvaluationReport from a structured-output payload (EVALUATION_SCHEMA).
+    """
+    parents = []
+    for p in data.get("parents", []):
+        parents.append(Parent(
+            title=p.get("title", "").strip(),
+            evidence=[Evidence(chunk=e.get("chunk"), quote=_quoted(e.get("quote", ""))) for e in p.get("evidence", [])],
+            additional_evidence=[
+                Evidence(chunk=e.get("chunk"), quote=_quoted(e.get("quote", "")))
+                for e in p.get("additional_evidence", [])
+            ],
+            children=[
+                Child(fact=_quoted(c.get("incident_fact", "")), why=c.get("why", "").strip())
+                for c in p.get("children", [])
+            ],
+        ))
+    return EvaluationReport(
+        decision=_norm_decision(data.get("decision", "")) or "Not enough policy evidence",
+        parents=parents,
+        reason=data.get("reason", "").strip(),
+        unmapped=[a.strip() for a in data.get("unmapped_actions", []) if a.strip()],
+    )
+
+
+def report_to_dict(report: EvaluationReport) -> Dict[str, Any]:
+    """
+    JSON-safe copy of a typed report (job results); report_from_dict reverses it.
+    """
+    return asdict(report)
+
+
+def report_from_dict(data: Dict[str, Any]) -> EvaluationReport:
+    return EvaluationReport(
+        decision=data["decision"],
+        parents=[
+            Parent(
+                title=p["title"],
+                evidence=[Evidence(**e) for e in p["evidence"]],
+                additional_evidence=[Evidence(**e) for e in p["additional_evidence"]],
+                children=[Child(**c) for c in p["children"]],
+            )
+            for p in data["parents"]
+        ],
+        trailing=data.get("trailing", []),
+        reason=data.get("reason", ""),
+        unmapped=data.get("unmapped", []),
+    )
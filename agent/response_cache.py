@@ -0,0 +1,163 @@
+# agent/response_cache.py
+#
+# On-disk cache for deterministic (temperature=0) LLM stages
+# - Key = sha256(model, stage, prompt template version, prompt)
+# - TTL + max-entries eviction (least recently used first)
+# - Hit/miss counters per stage
+# - Bypass with LLM_CACHE_BYPASS=1 (or bypass=True per call)
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Optional
+
+CACHE_DIR = "cache"
+RESPONSE_CACHE_FILE = os.path.join(CACHE_DIR, "llm_responses.sqlite")
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+RESPONSE_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+# one connection per (thread, path); the schema is created once per path
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def response_key(model: str, stage: str, template_version: int, prompt: str) -> str:
+    h = hashlib.sha256()
+    for part in (model, stage, str(template_version)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    h.update(prompt.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        " key TEXT PRIMARY KEY,"
+        " stage TEXT NOT NULL,"
+        " model TEXT NOT NULL,"
+        " response TEXT NOT NULL,"
+        " created_at REAL NOT NULL,"
+        " last_used REAL NOT NULL)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)"
+    )
+    conn.commit()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """
+    This thread's connection to path (opened once, then reused).
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is not None:
+        return conn
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    with _schema_lock:
+        if path not in _schema_ready:
+            _create_schema(conn)
+            _schema_ready.add(path)
+    conns[path] = conn
+    return conn
+
+
+class ResponseCache:
+    """
+    SQLite-backed response cache shared by threads and backend processes.
+    """
+
+    def __init__(
+        self,
+        path: str = RESPONSE_CACHE_FILE,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        bypass: bool = RESPONSE_CACHE_BYPASS,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.bypass = bypass
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    def get(self, key: str, stage: str, bypass: bool = False) -> Optional[str]:
+        if self.bypass or bypass:
+            return None
+        now = time.time()
+        with _lock:
+            conn = _connect(self.path)
+            with conn:
+                row = conn.execute(
+                    "SELECT response, created_at FROM responses WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is not None and now - row[1] > self.ttl_seconds:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    row = None
+                elif row is not None:
+                    conn.execute(
+                        "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+                    )
+
+            counter = self.misses if row is None else self.hits
+            counter[stage] = counter.get(stage, 0) + 1
+        return None if row is None else row[0]
+
+    def put(self, key: str, stage: str, model: str, response: str, bypass: bool = False) -> None:
+        if self.bypass or bypass:
+            return
+        now = time.time()
+        with _lock:
+            conn = _connect(self.path)
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses"
+                    " (key, stage, model, response, created_at, last_used)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, stage, model, response, now, now),
+                )
+                self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        (count,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with _lock:
+            stages = set(self.hits) | set(self.misses)
+            return {
+                stage: {
+                    "hits": self.hits.get(stage, 0),
+                    "misses": self.misses.get(stage, 0),
+                }
+                for stage in sorted(stages)
+            }
+
+
+_default_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
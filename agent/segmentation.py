@@ -0,0 +1,145 @@
+# agent/segmentation.py
+#
+# Sentence segmentation engine (one per process)
+# - Punkt resources are checked/downloaded and the model is loaded ONCE
+# - Optional compiled-regex fast path for clean text (no abbreviations etc.)
+# - Batch segmentation of several documents
+# - Per-call timings (calls, sentences, seconds) per mode
+
+import os
+import re
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import nltk
+
+# "punkt" (default, abbreviation-aware) or "regex" (fast path for clean text)
+SEGMENTER_MODE = os.getenv("SEGMENTER_MODE", "punkt").lower()
+
+# terminator (+ closing quotes/brackets), whitespace, then an uppercase/digit start
+_REGEX_SPLIT = re.compile(r"[.!?][\"'”’)\]]*(\s+)(?=[\"'“‘(\[]*[A-Z0-9])")
+
+
+class SentenceSegmenter:
+    """
+    segment()/span_tokenize() return stripped, non-empty sentences (or their
+    (start, end) offsets) of already-normalized text.
+    """
+
+    def __init__(self, language: str = "english", mode: str = SEGMENTER_MODE):
+        self.language = language
+        self.mode = mode
+        self._tokenizer = None
+        self._lock = threading.RLock()  # load() records its timing while holding it
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self.last_timing: Dict[str, float] = {}
+
+    # ---------------- loading ----------------
+
+    @staticmethod
+    def ensure_resources() -> None:
+        """
+        Ensure NLTK sentence tokenizer resources are installed.
+        nltk>=3.8.2 uses punkt_tab; older versions use the punkt pickle.
+        """
+        resources = [
+            ("tokenizers/punkt", "punkt"),
+            ("tokenizers/punkt_tab/english", "punkt_tab"),
+        ]
+        for resource, package in resources:
+            try:
+                nltk.data.find(resource)
+            except LookupError:
+                nltk.download(package, quiet=True)
+
+    def load(self):
+        """
+        Load the Punkt model once (thread-safe); later calls are free.
+        """
+        if self._tokenizer is not None:
+            return self._tokenizer
+        with self._lock:
+            if self._tokenizer is None:
+                started = time.perf_counter()
+                self.ensure_resources()
+                try:
+                    from nltk.tokenize.punkt import PunktTokenizer
+                    self._tokenizer = PunktTokenizer(self.language)
+                except ImportError:  # nltk < 3.8.2
+                    self._tokenizer = nltk.data.load(f"tokenizers/punkt/{self.language}.pickle")
+                self._record("load", 0, time.perf_counter() - started)
+        return self._tokenizer
+
+    # ---------------- segmentation ----------------
+
+    def _raw_spans(self, text: str, mode: str) -> List[Tuple[int, int]]:
+        if mode == "regex":
+            spans = []
+            start = 0
+            for m in _REGEX_SPLIT.finditer(text):
+                spans.append((start, m.start(1)))
+                start = m.end()
+            spans.append((start, len(text)))
+            return spans
+        return list(self.load().span_tokenize(text))
+
+    def span_tokenize(self, text: str, mode: Optional[str] = None) -> List[Tuple[int, int]]:
+        """
+        (start, end) offsets of each stripped, non-empty sentence in text.
+        """
+        mode = mode or self.mode
+        started = time.perf_counter()
+
+        spans: List[Tuple[int, int]] = []
+        for s, e in self._raw_spans(text, mode):
+            while s < e and text[s].isspace():
+                s += 1
+            while e > s and text[e - 1].isspace():
+                e -= 1
+            if e > s:
+                spans.append((s, e))
+
+        self._record(mode, len(spans), time.perf_counter() - started)
+        return spans
+
+    def segment(self, text: str, mode: Optional[str] = None) -> List[str]:
+        return [text[s:e] for s, e in self.span_tokenize(text, mode=mode)]
+
+    def segment_many(self, texts: List[str], mode: Optional[str] = None) -> List[List[str]]:
+        """
+        Segment several documents in one call (model loaded once, one timing entry each).
+        """
+        if (mode or self.mode) != "regex":
+            self.load()
+        return [self.segment(t, mode=mode) for t in texts]
+
+    # ---------------- timings ----------------
+
+    def _record(self, mode: str, n_sentences: int, seconds: float) -> None:
+        with self._lock:
+            entry = self._stats.setdefault(mode, {"calls": 0, "sentences": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["sentences"] += n_sentences
+            entry["seconds"] += seconds
+            self.last_timing = {"mode": mode, "sentences": n_sentences, "seconds": seconds}
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Cumulative {mode: {calls, sentences, seconds, avg_ms}} for this process.
+        """
+        out = {}
+        for mode, entry in self._stats.items():
+            calls = entry["calls"] or 1
+            out[mode] = dict(entry, avg_ms=1000 * entry["seconds"] / calls)
+        return out
+
+
+_segmenter: Optional[SentenceSegmenter] = None
+
+
+def get_segmenter() -> SentenceSegmenter:
+    global _segmenter
+    if _segmenter is None:
+        _segmenter = SentenceSegmenter()
+    return _segmenter
@@ -0,0 +1,133 @@
+# agent/text_normalize.py
+#
+# Single-pass text normalization for PDF-extracted text
+# - One str.translate (CR/LF/NBSP -> space, length-preserving) + one compiled regex
+#   (runs of whitespace and "(cid:N)" glyph artifacts -> one space; a plain
+#   whitespace regex when the text has no cid artifacts)
+# - Optional offset map: normalized position -> (page, offset in that page's text)
+# - normalize_chunk(): memoized variant for search results / query chunks,
+#   which repeat across queries and analyses
+
+import os
+import re
+import bisect
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+NORMALIZE_CACHE_SIZE = int(os.getenv("NORMALIZE_CACHE_SIZE", "4096"))
+
+_SPACE_TABLE = str.maketrans({"\r": " ", "\n": " ", "\xa0": " "})
+
+# Whitespace/cid run to collapse: whitespace followed by more run tokens, or a
+# run starting with a cid artifact. A lone whitespace character is left as-is
+# (same as the old \s{2,} rule).
+_RUN_RE = re.compile(r"\s(?:\s|\(cid:\d+\))+|\(cid:\d+\)(?:\s|\(cid:\d+\))*")
+
+# Text without any cid artifact (the common case) only needs whitespace runs
+_WS_RUN_RE = re.compile(r"\s{2,}")
+
+
+def normalize_text(text: str) -> str:
+    # Fix Windows line breaks and PDF artifacts
+    text = text.translate(_SPACE_TABLE)
+    run_re = _RUN_RE if "(cid:" in text else _WS_RUN_RE
+    return run_re.sub(" ", text).strip()
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_chunk(text: str) -> str:
+    """
+    normalize_text, memoized (retrieval results repeat across queries).
+    """
+    return normalize_text(text)
+
+
+class OffsetMap:
+    """
+    Maps positions in normalized text back to the original text.
+    Stored as aligned runs: unstripped[n_starts[k]:] was copied verbatim from
+    original[o_starts[k]:] up to the next run (a collapsed run maps to its start);
+    lead = characters removed by the final strip().
+    """
+
+    def __init__(
+        self,
+        n_starts: List[int],
+        o_starts: List[int],
+        lead: int = 0,
+        page_starts: Optional[List[int]] = None,
+        page_numbers: Optional[List[int]] = None,
+    ):
+        self.n_starts = n_starts
+        self.o_starts = o_starts
+        self.lead = lead
+        self.page_starts = page_starts or [0]
+        self.page_numbers = page_numbers or [1]
+
+    def original_offset(self, pos: int) -> int:
+        pos += self.lead
+        k = bisect.bisect_right(self.n_starts, pos) - 1
+        return self.o_starts[k] + (pos - self.n_starts[k])
+
+    def locate(self, pos: int) -> Tuple[int, int]:
+        """
+        (page number, character offset within that page's extracted text)
+        """
+        orig = self.original_offset(pos)
+        p = max(0, bisect.bisect_right(self.page_starts, orig) - 1)
+        return self.page_numbers[p], orig - self.page_starts[p]
+
+
+def normalize_with_offsets(
+    text: str,
+    page_starts: Optional[List[int]] = None,
+    page_numbers: Optional[List[int]] = None,
+) -> Tuple[str, OffsetMap]:
+    """
+    Same output as normalize_text, plus an OffsetMap back into text.
+    page_starts/page_numbers: where each page begins in text (and its 1-based number).
+    """
+    translated = text.translate(_SPACE_TABLE)
+
+    parts: List[str] = []
+    n_starts: List[int] = [0]
+    o_starts: List[int] = [0]
+    n_pos = 0
+    o_pos = 0
+    for m in _RUN_RE.finditer(translated):
+        s, e = m.span()
+        parts.append(translated[o_pos:s])
+        n_pos += s - o_pos
+        # the collapsed space maps to the start of the run, what follows to e
+        n_starts.append(n_pos)
+        o_starts.append(s)
+        parts.append(" ")
+        n_pos += 1
+        n_starts.append(n_pos)
+        o_starts.append(e)
+        o_pos = e
+    parts.append(translated[o_pos:])
+
+    out = "".join(parts)
+    stripped = out.lstrip()
+    lead = len(out) - len(stripped)
+    return stripped.rstrip(), OffsetMap(n_starts, o_starts, lead, page_starts, page_numbers)
+
+
+def normalize_pages(pages: List[str]) -> Tuple[str, OffsetMap]:
+    """
+    Normalize extracted page texts joined the way read_pdf_text joins them
+    (blank pages dropped, "\\n" between pages), with a page-aware OffsetMap.
+    """
+    kept = [(i + 1, t) for i, t in enumerate(pages) if t.strip()]
+    page_starts: List[int] = []
+    pos = 0
+    for _, t in kept:
+        page_starts.append(pos)
+        pos += len(t) + 1
+    joined = "\n".join(t for _, t in kept)
+    return normalize_with_offsets(
+        joined,
+        page_starts=page_starts or None,
+        page_numbers=[n for n, _ in kept] or None,
+    )
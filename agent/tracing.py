@@ -0,0 +1,261 @@
+# agent/tracing.py
+#
+# Stage-level tracing + process-wide metrics for the analysis pipeline
+# - Trace("run_agent") per analysis; trace.span("retrieve") times one stage
+# - tag() / record_cache() / record_tokens() annotate the innermost open span
+#   (context-local, so concurrent analyses never mix) and feed the counters
+# - Every finished span / trace is one JSON log line (TRACE_JSON_LOGS=0 to mute)
+# - render_prometheus(): text exposition of stage latency histograms, error
+#   counts, cache hits/misses and token counts (served at /_api/metrics)
+# - Analyses run in worker processes: each one stores METRICS.snapshot() in
+#   the job queue, and the web backend renders the sum of all snapshots
+
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+TRACE_JSON_LOGS = os.getenv("TRACE_JSON_LOGS", "1").lower() not in ("0", "false", "no")
+
+# Stage latency histogram buckets (seconds)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+@dataclass
+class Span:
+    stage: str
+    trace_id: str
+    started: float                       # epoch seconds
+    seconds: float = 0.0
+    status: str = "ok"
+    tags: Dict[str, Any] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "ms": round(self.seconds * 1000, 2),
+            "status": self.status,
+            **self.tags,
+        }
+
+
+# --------------------------------------------------
+# Metrics registry
+# --------------------------------------------------
+
+class _Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_buckets: Dict[str, List[int]] = {}
+        self.stage_sum: Dict[str, float] = {}
+        self.stage_count: Dict[str, int] = {}
+        self.stage_errors: Dict[str, int] = {}
+        self.cache: Dict[Tuple[str, str], int] = {}     # (cache, "hit"/"miss") -> n
+        self.tokens: Dict[Tuple[str, str], int] = {}    # (stage, "input"/"output") -> n
+
+    def observe(self, stage: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            buckets = self.stage_buckets.setdefault(stage, [0] * len(BUCKETS))
+            for i, le in enumerate(BUCKETS):
+                if seconds <= le:
+                    buckets[i] += 1
+            self.stage_sum[stage] = self.stage_sum.get(stage, 0.0) + seconds
+            self.stage_count[stage] = self.stage_count.get(stage, 0) + 1
+            if not ok:
+                self.stage_errors[stage] = self.stage_errors.get(stage, 0) + 1
+
+    def add(self, table: Dict[Tuple[str, str], int], key: Tuple[str, str], n: int) -> None:
+        with self._lock:
+            table[key] = table.get(key, 0) + n
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        JSON-safe copy of every counter (merge() adds one back in).
+        """
+        with self._lock:
+            return {
+                "stage_buckets": {k: list(v) for k, v in self.stage_buckets.items()},
+                "stage_sum": dict(self.stage_sum),
+                "stage_count": dict(self.stage_count),
+                "stage_errors": dict(self.stage_errors),
+                "cache": [[k[0], k[1], n] for k, n in self.cache.items()],
+                "tokens": [[k[0], k[1], n] for k, n in self.tokens.items()],
+            }
+
+    def merge(self, snap: Dict[str, Any]) -> None:
+        with self._lock:
+            for stage, buckets in snap.get("stage_buckets", {}).items():
+                mine = self.stage_buckets.setdefault(stage, [0] * len(BUCKETS))
+                for i, n in enumerate(buckets[:len(BUCKETS)]):
+                    mine[i] += n
+            for table, values in (
+                (self.stage_sum, snap.get("stage_sum", {})),
+                (self.stage_count, snap.get("stage_count", {})),
+                (self.stage_errors, snap.get("stage_errors", {})),
+            ):
+                for stage, n in values.items():
+                    table[stage] = table.get(stage, 0) + n
+            for table, rows in ((self.cache, snap.get("cache", [])), (self.tokens, snap.get("tokens", []))):
+                for a, b, n in rows:
+                    table[(a, b)] = table.get((a, b), 0) + n
+
+
+METRICS = _Metrics()
+
+
+def _emit(record: Dict[str, Any]) -> None:
+    if TRACE_JSON_LOGS:
+        print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+
+# --------------------------------------------------
+# Traces / spans
+# --------------------------------------------------
+
+class Trace:
+    """
+    One analysis: an id, its finished spans (in completion order) and a summary.
+    """
+
+    def __init__(self, name: str, **tags):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.tags = tags
+        self.spans: List[Span] = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str, **tags) -> Iterator[Span]:
+        """
+        Time one stage. Do not yield from a generator inside the block:
+        the span must open and close in the same context.
+        """
+        s = Span(stage=stage, trace_id=self.trace_id, started=time.time(), tags=dict(tags))
+        token = _current_span.set(s)
+        started = time.perf_counter()
+        try:
+            yield s
+        except BaseException:
+            s.status = "error"
+            raise
+        finally:
+            s.seconds = time.perf_counter() - started
+            _current_span.reset(token)
+            with self._lock:
+                self.spans.append(s)
+            METRICS.observe(stage, s.seconds, s.status == "ok")
+            _emit({"event": "span", "trace": self.name, "trace_id": self.trace_id, **s.as_dict()})
+
+    def summary(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [s.as_dict() for s in self.spans]
+
+    def finish(self, status: str = "ok") -> None:
+        seconds = time.perf_counter() - self._started
+        METRICS.observe(self.name, seconds, status == "ok")
+        _emit({
+            "event": "trace",
+            "trace": self.name,
+            "trace_id": self.trace_id,
+            "ms": round(seconds * 1000, 2),
+            "status": status,
+            **self.tags,
+            "stages": {s["stage"]: s["ms"] for s in self.summary()},
+        })
+
+
+def tag(**tags) -> None:
+    """
+    Set tags on the innermost open span (no-op outside a span).
+    """
+    s = _current_span.get()
+    if s is not None:
+        s.tags.update(tags)
+
+
+def _bump(name: str, n: int) -> None:
+    s = _current_span.get()
+    if s is not None and n:
+        s.tags[name] = s.tags.get(name, 0) + n
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0) -> None:
+    if hits:
+        METRICS.add(METRICS.cache, (cache, "hit"), hits)
+    if misses:
+        METRICS.add(METRICS.cache, (cache, "miss"), misses)
+    _bump(f"{cache}_cache_hits", hits)
+    _bump(f"{cache}_cache_misses", misses)
+
+
+def record_tokens(stage: str, input_tokens: int = 0, output_tokens: int = 0) -> None:
+    if input_tokens:
+        METRICS.add(METRICS.tokens, (stage, "input"), input_tokens)
+    if output_tokens:
+        METRICS.add(METRICS.tokens, (stage, "output"), output_tokens)
+    _bump("input_tokens", input_tokens)
+    _bump("output_tokens", output_tokens)
+
+
+def record_usage(stage: str, usage: Any) -> None:
+    """
+    Token counts from an OpenAI usage object (Responses or Embeddings shape).
+    """
+    if usage is None:
+        return
+    input_tokens = getattr(usage, "input_tokens", None)
+    if input_tokens is None:
+        input_tokens = getattr(usage, "prompt_tokens", 0)
+    record_tokens(stage, input_tokens or 0, getattr(usage, "output_tokens", 0) or 0)
+
+
+# --------------------------------------------------
+# Prometheus text format
+# --------------------------------------------------
+
+def render_prometheus(snapshots: Optional[List[Dict[str, Any]]] = None) -> str:
+    """
+    This process's METRICS plus snapshots (other processes' METRICS.snapshot()).
+    """
+    m = METRICS
+    if snapshots:
+        m = _Metrics()
+        for snap in [METRICS.snapshot()] + list(snapshots):
+            m.merge(snap)
+    lines: List[str] = []
+    with m._lock:
+        lines.append("# HELP analysis_stage_seconds Pipeline stage latency.")
+        lines.append("# TYPE analysis_stage_seconds histogram")
+        for stage in sorted(m.stage_count):
+            for le, n in zip(BUCKETS, m.stage_buckets[stage]):
+                lines.append(f'analysis_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {n}')
+            lines.append(f'analysis_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {m.stage_count[stage]}')
+            lines.append(f'analysis_stage_seconds_sum{{stage="{stage}"}} {m.stage_sum[stage]:.6f}')
+            lines.append(f'analysis_stage_seconds_count{{stage="{stage}"}} {m.stage_count[stage]}')
+
+        lines.append("# HELP analysis_stage_errors_total Stages that raised.")
+        lines.append("# TYPE analysis_stage_errors_total counter")
+        for stage in sorted(m.stage_errors):
+            lines.append(f'analysis_stage_errors_total{{stage="{stage}"}} {m.stage_errors[stage]}')
+
+        lines.append("# HELP analysis_cache_requests_total Cache lookups by result.")
+        lines.append("# TYPE analysis_cache_requests_total counter")
+        for (cache, result), n in sorted(m.cache.items()):
+            lines.append(f'analysis_cache_requests_total{{cache="{cache}",result="{result}"}} {n}')
+
+        lines.append("# HELP analysis_tokens_total Model tokens by stage and direction.")
+        lines.append("# TYPE analysis_tokens_total counter")
+        for (stage, kind), n in sorted(m.tokens.items()):
+            lines.append(f'analysis_tokens_total{{stage="{stage}",kind="{kind}"}} {n}')
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,130 @@
+# agent/vector_store_cache.py
+#
+# Concurrency-safe policy-hash -> vector_store_id cache
+# - In-process memo (no disk read on hits)
+# - Single-flight: concurrent callers for the same policy wait on ONE creation
+#   (per-key thread lock + per-key lock file for other backend processes)
+# - Writes merge under an exclusive file lock and land via atomic rename,
+#   so concurrent misses for different policies never lose an entry
+
+import os
+import json
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+from agent.tracing import record_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+CACHE_DIR = "cache"
+CACHE_FILE = os.path.join(CACHE_DIR, "vector_store_cache.json")
+LOCK_DIR = os.path.join(CACHE_DIR, "locks")
+
+_memo: Dict[str, str] = {}
+_memo_lock = threading.Lock()
+_key_locks: Dict[str, threading.Lock] = {}
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def single_flight(key: str) -> Iterator[None]:
+    """
+    Serialize work for one key across threads and processes.
+    Callers should re-check for an existing result once inside.
+    """
+    with _memo_lock:
+        lock = _key_locks.setdefault(key, threading.Lock())
+    with lock:
+        with _file_lock(os.path.join(LOCK_DIR, f"{key}.lock")):
+            yield
+
+
+def load_cache() -> dict:
+    if not os.path.exists(CACHE_FILE):
+        return {}
+    with open(CACHE_FILE, "r") as f:
+        return json.load(f)
+
+
+def _entry_id(value) -> Optional[str]:
+    if isinstance(value, dict):
+        return value.get("vector_store_id")
+    return value
+
+
+def record(file_hash: str, vector_store_id: str) -> None:
+    """
+    Add one entry: read-merge-write under the cache file lock, atomic rename.
+    """
+    with _file_lock(CACHE_FILE + ".lock"):
+        data = load_cache()
+        data[file_hash] = vector_store_id
+        tmp = f"{CACHE_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, CACHE_FILE)
+    with _memo_lock:
+        _memo[file_hash] = vector_store_id
+
+
+def lookup(file_hash: str) -> Optional[str]:
+    with _memo_lock:
+        vs_id = _memo.get(file_hash)
+    if vs_id:
+        return vs_id
+
+    vs_id = _entry_id(load_cache().get(file_hash))
+    if vs_id:
+        with _memo_lock:
+            _memo[file_hash] = vs_id
+    return vs_id
+
+
+def policy_hash_for(vector_store_id: str) -> Optional[str]:
+    """
+    Reverse lookup: the policy hash a vector store was created for.
+    """
+    with _memo_lock:
+        for file_hash, vs_id in _memo.items():
+            if vs_id == vector_store_id:
+                return file_hash
+    for file_hash, value in load_cache().items():
+        if _entry_id(value) == vector_store_id:
+            return file_hash
+    return None
+
+
+def get_or_create(file_hash: str, create: Callable[[], str]) -> str:
+    """
+    Return the cached vector store id for file_hash, creating it at most once.
+    """
+    vs_id = lookup(file_hash)
+    if vs_id:
+        record_cache("vector_store", hits=1)
+        return vs_id
+
+    with single_flight(file_hash):
+        vs_id = lookup(file_hash)  # another caller may have finished first
+        if vs_id:
+            record_cache("vector_store", hits=1)
+            return vs_id
+        record_cache("vector_store", misses=1)
+        vs_id = create()
+        record(file_hash, vs_id)
+        return vs_id
@@ -1,8 +1,44 @@
+import contextlib
+
 import reflex as rx
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
 
+from agent.embedding_store import run_cpu
+from agent.job_queue import get_job_queue
+from agent.job_worker import ANALYSIS_WORKERS, start_worker_pool, stop_worker_pool
+from agent.tracing import render_prometheus
 from app.pages.index import index_page
 from app.pages.results import results_page
+from app.state import AppState
+
+
+async def metrics(request):
+    # Prometheus scrape target: stage latencies, cache hits/misses, tokens,
+    # summed over this process and every analysis worker (job queue snapshots)
+    snapshots = await run_cpu(get_job_queue().worker_metrics)
+    return PlainTextResponse(
+        render_prometheus(snapshots), media_type="text/plain; version=0.0.4"
+    )
+
+
+# Mounted in front of the Reflex backend (served under /_api like other routes)
+metrics_api = Starlette(routes=[Route("/_api/metrics", metrics)])
+
+
+@contextlib.asynccontextmanager
+async def analysis_workers():
+    # Analyses run in their own processes, never in this one
+    # (ANALYSIS_WORKERS=0: pools are started separately, python -m agent.job_worker)
+    pool = start_worker_pool(ANALYSIS_WORKERS)
+    try:
+        yield
+    finally:
+        stop_worker_pool(pool)
+
 
-app = rx.App()
+app = rx.App(api_transformer=metrics_api)
+app.register_lifespan_task(analysis_workers)
 app.add_page(index_page, route="/", title="Incident–Policy AI Checker")
-app.add_page(results_page, route="/results", title="Results")
+app.add_page(results_page, route="/results", title="Results", on_load=AppState.resume_job)
@@ -1,5 +1,5 @@
 import reflex as rx
-from app.state import AppState
+from app.state import AppState, MAX_POLICIES
 
 
 def hero_section():
@@ -60,7 +60,7 @@ def hero_section():
     )
 
 
-def upload_panel(title: str, subtitle: str, upload_id: str, upload_handler, saved_cond):
+def upload_panel(title: str, subtitle: str, upload_id: str, upload_handler, saved_cond, max_files: int = 1):
     return rx.card(
         rx.vstack(
             rx.hstack(
@@ -78,14 +78,15 @@ def upload_panel(title: str, subtitle: str, upload_id: str, upload_handler, save
 
             rx.upload(
                 rx.vstack(
-                    rx.button("Choose PDF", width="100%", color_scheme="teal"),
+                    rx.button("Choose PDF" if max_files == 1 else "Choose PDFs", width="100%", color_scheme="teal"),
                     rx.text("Selected: ", rx.selected_files(upload_id), color_scheme="gray", font_size="2"),
                     spacing="2",
                     width="100%",
                 ),
                 id=upload_id,
                 accept={"application/pdf": [".pdf"]},
-                max_files=1,
+                max_files=max_files,
+                multiple=max_files > 1,
                 border="2px dashed #94a3b8",
                 padding="16px",
                 width="100%",
@@ -135,7 +136,14 @@ def analyzing_panel():
         rx.hstack(
             rx.spinner(size="3"),
             rx.vstack(
-                rx.heading("Analyzing documents…", size="4"),
+                rx.cond(
+                    AppState.queue_position > 0,
+                    rx.heading(
+                        "Queued — position " + AppState.queue_position.to_string(),
+                        size="4",
+                    ),
+                    rx.heading("Analyzing documents…", size="4"),
+                ),
                 rx.text(
                     "Embedding policy chunks → retrieving evidence → evaluating violations. "
                     "This can take 30–90 seconds depending on PDF length.",
@@ -174,11 +182,12 @@ def index_page():
 
                 rx.grid(
                     upload_panel(
-                        "Upload Hospital Policy (PDF)",
-                        "Examples: PHIPA, hospital privacy policy, staff conduct rules.",
+                        "Upload Hospital Policies (PDF)",
+                        f"One or more (up to {MAX_POLICIES}): PHIPA, hospital privacy policy, staff conduct rules.",
                         "policy_upload",
                         AppState.handle_policy_upload,
-                        AppState.policy_path != None,
+                        AppState.policy_paths.length() > 0,
+                        max_files=MAX_POLICIES,
                     ),
                     upload_panel(
                         "Upload Incident Report (PDF)",
@@ -15,7 +15,37 @@ def decision_css():
     """)
 
 
+def pending_hero():
+    return rx.card(
+        rx.hstack(
+            rx.spinner(size="3"),
+            rx.vstack(
+                rx.heading("Evaluating incident…", size="6", color="#0f172a"),
+                rx.text(
+                    "The report below fills in as the evaluator writes it.",
+                    color_scheme="gray",
+                ),
+                spacing="1",
+                align="start",
+            ),
+            spacing="4",
+            align="center",
+        ),
+        width="100%",
+        border_radius="22px",
+        style={"boxShadow": "0 14px 40px rgba(0,0,0,0.10)"},
+    )
+
+
 def decision_hero():
+    return rx.cond(
+        AppState.decision == "",
+        rx.cond(AppState.is_running, pending_hero(), rx.fragment()),
+        decision_hero_final(),
+    )
+
+
+def decision_hero_final():
     return rx.cond(
         AppState.decision == "Violation",
         rx.card(
@@ -111,6 +141,96 @@ def decision_hero():
     )
 
 
+def violation_child(child):
+    return rx.vstack(
+        rx.hstack(
+            rx.badge(child.label, variant="soft", color_scheme="red"),
+            rx.text(child.fact, weight="medium"),
+            spacing="2",
+            align="center",
+        ),
+        rx.text(child.why, color_scheme="gray", font_size="2"),
+        spacing="1",
+        align="start",
+        width="100%",
+    )
+
+
+def violation_card(violation):
+    return rx.card(
+        rx.vstack(
+            rx.hstack(
+                rx.badge(violation.label, variant="solid", color_scheme="red"),
+                rx.text(violation.title, weight="bold"),
+                spacing="2",
+                align="center",
+            ),
+            rx.vstack(
+                rx.foreach(
+                    violation.evidence,
+                    lambda ev: rx.text(ev, font_size="2", font_style="italic"),
+                ),
+                spacing="1",
+                align="start",
+                width="100%",
+            ),
+            rx.divider(),
+            rx.vstack(
+                rx.foreach(violation.children, violation_child),
+                spacing="3",
+                align="start",
+                width="100%",
+            ),
+            spacing="3",
+            align="stretch",
+        ),
+        width="100%",
+        border_radius="18px",
+        style={"boxShadow": "0 10px 25px rgba(0,0,0,0.08)"},
+    )
+
+
+def violations_section():
+    return rx.cond(
+        AppState.violations.length() > 0,
+        rx.vstack(
+            rx.heading("Violations", size="5"),
+            rx.foreach(AppState.violations, violation_card),
+            spacing="3",
+            width="100%",
+        ),
+    )
+
+
+def stage_timing_row(timing):
+    return rx.hstack(
+        rx.badge(timing.stage, variant="soft", color_scheme="gray"),
+        rx.text(timing.ms + " ms", font_size="2", weight="medium"),
+        rx.text(timing.tags, font_size="1", color_scheme="gray"),
+        spacing="3",
+        align="center",
+        width="100%",
+    )
+
+
+def stage_timings_section():
+    return rx.cond(
+        AppState.stage_timings.length() > 0,
+        rx.card(
+            rx.vstack(
+                rx.text("Stage Timings", weight="bold"),
+                rx.foreach(AppState.stage_timings, stage_timing_row),
+                spacing="2",
+                align="start",
+                width="100%",
+            ),
+            width="100%",
+            border_radius="18px",
+            style={"boxShadow": "0 10px 25px rgba(0,0,0,0.08)"},
+        ),
+    )
+
+
 def results_page():
     # Build up to 10 cards (older Reflex compatible, avoids foreach typing issues)
     chunk_cards = []
@@ -151,15 +271,32 @@ def results_page():
 
             rx.heading("Results", size="8", color="#0f766e"),
 
+            rx.cond(
+                AppState.error != "",
+                rx.callout(
+                    AppState.error,
+                    icon="triangle_alert",
+                    color_scheme="red",
+                    variant="soft",
+                    width="100%",
+                ),
+            ),
+
             decision_hero(),
 
+            violations_section(),
+
             rx.card(
                 rx.vstack(
                     rx.hstack(
                         rx.icon("file_search", size=22),
                         rx.vstack(
                             rx.text("Final Decision Report", weight="bold"),
-                            rx.text("Generated from retrieved policy evidence.", color_scheme="gray", font_size="2"),
+                            rx.cond(
+                                AppState.is_streaming,
+                                rx.text("Streaming draft… final grouping follows.", color_scheme="gray", font_size="2"),
+                                rx.text("Generated from retrieved policy evidence.", color_scheme="gray", font_size="2"),
+                            ),
                             spacing="0",
                             align="start",
                         ),
@@ -199,6 +336,8 @@ def results_page():
                 ),
             ),
 
+            stage_timings_section(),
+
             width="min(980px, 92vw)",
             spacing="5",
             padding_y="40px",
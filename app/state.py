@@ -1,34 +1,189 @@
 import os
+import time
 import uuid
-from typing import Optional, List, Dict
+import asyncio
+import hashlib
+import dataclasses
+from typing import Optional, List, Dict, Tuple
 
 import reflex as rx
 
-from agent.embedding_store import (
-    get_or_create_vector_store,
-    retrieve_top_chunks,
-    evaluate_incident,
-    read_pdf_text,
-    normalize_text,
-    polish_and_group_violations,
-)
+from agent.embedding_store import parse_decision, run_cpu
+from agent.job_queue import JOB_STALE_SECONDS, QueueFull, UserLimitReached, get_job_queue
+from agent.job_worker import JOB_POLL_SECONDS
+from agent.report_format import EvaluationReport, parse_report, report_from_dict
 
 UPLOAD_DIR = "uploads"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+PDF_MAGIC = b"%PDF-"
+
+# Policies that can be checked together against one incident
+MAX_POLICIES = int(os.getenv("MAX_POLICIES", "5"))
+
+# A session stops following (and fails) a job after this long, or once no
+# analysis worker has reported in for JOB_STALE_SECONDS
+JOB_WAIT_TIMEOUT_SECONDS = float(os.getenv("JOB_WAIT_TIMEOUT_SECONDS", "1800"))
+
+# Per-stage timings card on the results page (SHOW_STAGE_TIMINGS=1 to enable)
+SHOW_STAGE_TIMINGS = os.getenv("SHOW_STAGE_TIMINGS", "0").lower() in ("1", "true", "yes")
+
+
+class UploadRejected(ValueError):
+    """Upload refused before it was stored (too large / not a PDF)."""
+
+
+async def store_upload_stream(
+    upload: rx.UploadFile,
+    ext: str = ".pdf",
+    max_bytes: int = MAX_UPLOAD_BYTES,
+) -> Tuple[str, str]:
+    """
+    Content-addressed, streaming upload storage: uploads/<sha256><ext>.
+    - Reads UPLOAD_CHUNK_SIZE at a time (constant memory per upload)
+    - Rejects non-PDF magic bytes and oversized files early
+    - Hashes in the same pass that writes the temp file
+    - If the same content is already stored, the temp file is dropped
+      (duplicate uploads cost no extra disk)
+    Returns (path, sha256).
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadRejected(f"File is larger than {max_bytes // (1024 * 1024)} MB.")
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    tmp_path = os.path.join(UPLOAD_DIR, f".tmp_{uuid.uuid4().hex}")
+    h = hashlib.sha256()
+    total = 0
+    head = b""
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                block = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not block:
+                    break
+
+                if len(head) < len(PDF_MAGIC):
+                    head += block[:len(PDF_MAGIC) - len(head)]
+                    if len(head) == len(PDF_MAGIC) and head != PDF_MAGIC:
+                        raise UploadRejected("File is not a PDF.")
+
+                total += len(block)
+                if total > max_bytes:
+                    raise UploadRejected(
+                        f"File is larger than {max_bytes // (1024 * 1024)} MB."
+                    )
+
+                h.update(block)
+                f.write(block)
+
+        if head != PDF_MAGIC:
+            raise UploadRejected("File is not a PDF.")
+
+        file_hash = h.hexdigest()
+        path = os.path.join(UPLOAD_DIR, f"{file_hash}{ext}")
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path, file_hash
+
+
+def unique_label(name: str, taken: List[str]) -> str:
+    """
+    name, or "name (2)", "name (3)", ... if already taken (report/evidence
+    labels must tell same-named policies apart).
+    """
+    label, n = name, 1
+    while label in taken:
+        n += 1
+        label = f"{name} ({n})"
+    return label
+
+
+@dataclasses.dataclass
+class ViolationChildView:
+    label: str          # "A1"
+    fact: str
+    why: str
+
+
+@dataclasses.dataclass
+class ViolationView:
+    label: str          # "A"
+    title: str
+    evidence: List[str]             # '[Chunk 3] "..."' (primary first)
+    children: List[ViolationChildView]
+
+
+def violation_views(report: EvaluationReport) -> List[ViolationView]:
+    views = []
+    for p_idx, parent in enumerate(report.parents):
+        letter = chr(ord("A") + p_idx) if p_idx < 26 else f"P{p_idx + 1}"
+        views.append(ViolationView(
+            label=letter,
+            title=parent.title,
+            evidence=[ev.render() for ev in parent.evidence + parent.additional_evidence],
+            children=[
+                ViolationChildView(label=f"{letter}{c_idx}", fact=child.fact, why=child.why)
+                for c_idx, child in enumerate(parent.children, 1)
+            ],
+        ))
+    return views
+
+
+@dataclasses.dataclass
+class StageTimingView:
+    stage: str          # "retrieve"
+    ms: str             # "812.4"
+    tags: str           # "llm_cache_misses=1 input_tokens=5120"
+
+
+def stage_timing_views(spans: List[Dict]) -> List[StageTimingView]:
+    """
+    spans: Trace.summary() of the analysis.
+    """
+    views = []
+    for span in spans:
+        tags = " ".join(
+            f"{k}={v}" for k, v in span.items() if k not in ("stage", "ms", "status")
+        )
+        if span["status"] != "ok":
+            tags = f"{span['status']} {tags}".strip()
+        views.append(StageTimingView(stage=span["stage"], ms=f"{span['ms']:.1f}", tags=tags))
+    return views
 
 
 class AppState(rx.State):
-    # Saved file paths (server-side)
-    policy_path: Optional[str] = None
+    # Saved file paths (server-side); one or more policies
+    policy_paths: List[str] = []
+    policy_names: List[str] = []   # original file names (evidence/report labels)
     incident_path: Optional[str] = None
 
+    # SHA-256 of the saved files (computed once, at upload time)
+    policy_hashes: List[str] = []
+    incident_hash: Optional[str] = None
+
+    # Queued analysis; kept in the browser so a reload or a backend restart
+    # can pick the job (and its stored result) up again
+    job_id: str = rx.LocalStorage("", name="analysis_job")
+    client_id: str = rx.LocalStorage("", name="client_id")   # per-user queue limits
+
     # UI status
     error: str = ""
     is_running: bool = False
+    is_streaming: bool = False   # report_text is still being filled in
+    queue_position: int = 0      # 1 = next to run; 0 = running / not queued
 
     # Results (keep types simple and consistent)
     top_chunks: List[Dict[str, str]] = []   # [{"score":"0.1234", "chunk":"..."}]
     decision: str = ""
     report_text: str = ""
+    violations: List[ViolationView] = []    # typed view of the report (Violation only)
+    stage_timings: List[StageTimingView] = []   # filled when SHOW_STAGE_TIMINGS is on
 
     # UI toggle
     show_chunks: bool = False
@@ -36,13 +191,9 @@ class AppState(rx.State):
     def toggle_chunks(self):
         self.show_chunks = not self.show_chunks
 
-    def _save_upload_bytes(self, original_name: str, data: bytes) -> str:
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-        safe_name = f"{uuid.uuid4().hex}_{original_name}".replace(" ", "_")
-        path = os.path.join(UPLOAD_DIR, safe_name)
-        with open(path, "wb") as f:
-            f.write(data)
-        return path
+    async def _save_upload(self, upload: rx.UploadFile) -> Tuple[str, str]:
+        ext = os.path.splitext(upload.filename or "")[1].lower() or ".pdf"
+        return await store_upload_stream(upload, ext=ext)
 
     # Upload handlers (Reflex upload_files -> this handler)
     async def handle_policy_upload(self, files: List[rx.UploadFile]):
@@ -50,18 +201,118 @@ class AppState(rx.State):
         if not files:
             self.error = "No policy file received."
             return
-        f = files[0]
-        data = await f.read()
-        self.policy_path = self._save_upload_bytes(f.filename, data)
+        paths, names, hashes = [], [], []
+        try:
+            for upload in files[:MAX_POLICIES]:
+                path, file_hash = await self._save_upload(upload)
+                if file_hash in hashes:
+                    continue
+                paths.append(path)
+                names.append(unique_label(os.path.basename(upload.filename or path), names))
+                hashes.append(file_hash)
+        except UploadRejected as e:
+            # never fall back to the previously uploaded policies
+            self.policy_paths, self.policy_names, self.policy_hashes = [], [], []
+            self.error = f"Policy upload rejected: {e}"
+            return
+        self.policy_paths, self.policy_names, self.policy_hashes = paths, names, hashes
+        if len(files) > MAX_POLICIES:
+            self.error = (
+                f"Only the first {MAX_POLICIES} policies are used; "
+                f"{len(files) - MAX_POLICIES} more were not uploaded."
+            )
 
     async def handle_incident_upload(self, files: List[rx.UploadFile]):
         self.error = ""
         if not files:
             self.error = "No incident file received."
             return
-        f = files[0]
-        data = await f.read()
-        self.incident_path = self._save_upload_bytes(f.filename, data)
+        try:
+            self.incident_path, self.incident_hash = await self._save_upload(files[0])
+        except UploadRejected as e:
+            # never fall back to the previously uploaded incident
+            self.incident_path, self.incident_hash = None, None
+            self.error = f"Incident upload rejected: {e}"
+
+    def _apply_result(self, result: Dict):
+        self.top_chunks = result["top_chunks"]
+        self.report_text = result["report"]
+        self.decision = result["decision"]
+        # typed report from the worker (per-policy titles etc.); results
+        # stored before it was added only have the text
+        typed = result.get("typed_report")
+        report = report_from_dict(typed) if typed else parse_report(result["report"])
+        self.violations = violation_views(report) if self.decision == "Violation" else []
+        self.stage_timings = (
+            stage_timing_views(result.get("stage_timings", [])) if SHOW_STAGE_TIMINGS else []
+        )
+        self.queue_position = 0
+        self.is_running = False
+        self.is_streaming = False
+
+    async def _follow_job(self, job_id: str, redirect: bool = True):
+        """
+        Mirror a queued job into the UI until it finishes: queue position while
+        waiting, evidence + streamed report while running, then the result.
+        Gives up (and fails the job) after JOB_WAIT_TIMEOUT_SECONDS, or when
+        no worker is alive to run it.
+        """
+        queue = get_job_queue()
+        redirected = not redirect
+        deadline = time.time() + JOB_WAIT_TIMEOUT_SECONDS
+        while True:
+            job = await run_cpu(queue.get, job_id)
+
+            if job is not None and job.status in ("queued", "running"):
+                reason = ""
+                if time.time() > deadline:
+                    reason = "Analysis timed out."
+                elif (
+                    time.time() - job.created_at > JOB_STALE_SECONDS
+                    and not await run_cpu(queue.workers_alive)
+                ):
+                    reason = "No analysis workers are running."
+                if reason and await run_cpu(queue.cancel, job_id, reason):
+                    job = await run_cpu(queue.get, job_id)
+
+            if job is None:
+                async with self:
+                    self.error = "Analysis not found (it may have expired)."
+                    self.job_id = ""
+                    self.is_running = False
+                    self.is_streaming = False
+                return
+
+            if job.status == "error":
+                async with self:
+                    self.error = f"Error while analyzing: {job.error}"
+                    self.queue_position = 0
+                    self.is_running = False
+                    self.is_streaming = False
+                return
+
+            if job.status == "done":
+                async with self:
+                    self._apply_result(job.result)
+                # Navigate after finishing
+                if not redirected:
+                    yield rx.redirect("/results")
+                return
+
+            evidence = job.progress.get("top_chunks")
+            async with self:
+                self.queue_position = job.position
+                if evidence:
+                    # Show evidence + partial report as soon as tokens arrive
+                    self.top_chunks = evidence
+                    self.report_text = job.progress.get("report", "")
+                    self.decision = parse_decision(self.report_text, default="")
+                    self.is_streaming = True
+            if evidence and not redirected:
+                redirected = True
+                yield rx.redirect("/results")
+
+            await asyncio.sleep(JOB_POLL_SECONDS)
 
     @rx.event(background=True)
     async def run_agent(self):
@@ -73,57 +324,52 @@ class AppState(rx.State):
             self.top_chunks = []
             self.decision = ""
             self.report_text = ""
+            self.violations = []
+            self.stage_timings = []
+            self.is_streaming = False
+            self.queue_position = 0
 
-            if not self.policy_path or not self.incident_path:
+            if not self.policy_paths or not self.incident_path:
                 self.error = "Please upload BOTH Policy PDF and Incident PDF."
                 self.is_running = False
                 return
 
-        # Heavy work outside lock
-        try:# Build incident text
-            incident_raw = read_pdf_text(self.incident_path)
-            incident_text = normalize_text(incident_raw)
-
-            # Create / load vector store for the policy
-            vs_id = get_or_create_vector_store(self.policy_path)
-
-            # Retrieve chunks (your function returns List[Tuple[score, text]])
-            retrieved = retrieve_top_chunks(
-                vector_store_id=vs_id,
-                incident_text=incident_text,
-                top_k=25,
-                target_queries=8,
-                per_query_k=6,
-            )
-
-            # Show top 10 in UI
-            top10 = []
-            for score, chunk_text in retrieved[:10]:
-                top10.append({"score": f"{float(score):.4f}", "chunk": str(chunk_text)})
-
-            # Evaluate (your evaluator expects the same retrieved list + incident_text)
-            report = evaluate_incident(retrieved, incident_text)
+            if not self.client_id:
+                self.client_id = uuid.uuid4().hex
+            user_id = self.client_id
+            payload = {
+                "policy_paths": self.policy_paths,
+                "policy_names": self.policy_names,
+                "policy_hashes": self.policy_hashes,
+                "incident_path": self.incident_path,
+                "incident_hash": self.incident_hash,
+            }
 
-            # Optional (you already do it in run_analysis; keep if you want same output)
-            report = polish_and_group_violations(report)
-            if "Decision: Violation" in report:
-                decision = "Violation"
-            elif "Decision: No violation" in report:
-                decision = "No violation"
-            else:
-                decision = "Not enough policy evidence"
-
-            # Save results back to state
+        # The analysis itself runs in the worker pool (agent/job_worker.py);
+        # this backend only queues it and follows its progress
+        try:
+            job_id = await run_cpu(get_job_queue().submit, user_id, payload)
+        except (QueueFull, UserLimitReached) as e:
             async with self:
-                self.top_chunks = top10
-                self.report_text = report
-                self.decision = decision
+                self.error = f"Analysis not started: {e} Please try again shortly."
                 self.is_running = False
+            return
 
-            # Navigate after finishing
-            yield rx.redirect("/results")
+        async with self:
+            self.job_id = job_id
+        async for event in self._follow_job(job_id):
+            yield event
 
-        except Exception as e:
-            async with self:
-                self.error = f"Error while analyzing: {e}"
-                self.is_running = False
+    @rx.event(background=True)
+    async def resume_job(self):
+        """
+        Results page on_load: re-attach to the browser's last job (after a
+        reload or backend restart) when this session has no result yet.
+        """
+        async with self:
+            job_id = self.job_id
+            if not job_id or self.is_running or self.report_text:
+                return
+            self.is_running = True
+        async for event in self._follow_job(job_id, redirect=False):
+            yield event
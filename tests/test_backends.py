@@ -0,0 +1,44 @@
+from typing import Any, Dict, List
+
+from agent.backends import SAMPLE_STRUCTURED
+from agent.report_format import EVALUATION_SCHEMA, report_from_json
+
+
+def schema_errors(data: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    # the subset of JSON schema EVALUATION_SCHEMA uses (strict structured outputs)
+    errors = []
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(data, dict):
+            return [f"{path}: expected object"]
+        props = schema.get("properties", {})
+        errors += [f"{path}.{k}: missing" for k in schema.get("required", []) if k not in data]
+        if schema.get("additionalProperties") is False:
+            errors += [f"{path}.{k}: not in schema" for k in data if k not in props]
+        for k, v in data.items():
+            if k in props:
+                errors += schema_errors(v, props[k], f"{path}.{k}")
+    elif kind == "array":
+        if not isinstance(data, list):
+            return [f"{path}: expected array"]
+        for i, item in enumerate(data):
+            errors += schema_errors(item, schema["items"], f"{path}[{i}]")
+    elif kind == "string":
+        if not isinstance(data, str):
+            errors.append(f"{path}: expected string")
+        elif "enum" in schema and data not in schema["enum"]:
+            errors.append(f"{path}: {data!r} not in enum")
+    elif kind == "integer" and not isinstance(data, int):
+        errors.append(f"{path}: expected integer")
+    return errors
+
+
+def test_sample_structured_matches_schema():
+    assert schema_errors(SAMPLE_STRUCTURED, EVALUATION_SCHEMA) == []
+
+
+def test_sample_structured_parses_to_report():
+    report = report_from_json(SAMPLE_STRUCTURED)
+    assert report.decision == "Violation"
+    assert report.parents[0].children[0].fact.startswith('"The nurse shared')
+    assert report.parents[0].evidence[0].chunk == 1
@@ -0,0 +1,199 @@
+import time
+
+import pytest
+
+from agent import job_queue
+from agent.job_queue import JobQueue, QueueFull, UserLimitReached
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(
+        str(tmp_path / "jobs.sqlite"), max_queued=3, user_max_pending=2, user_concurrency=1
+    )
+
+
+def age_heartbeat(queue: JobQueue, job_id: str, seconds: float) -> None:
+    job_queue._connect(queue.path).execute(
+        "UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - seconds, job_id)
+    )
+
+
+# --------------------------------------------------
+# Admission
+# --------------------------------------------------
+
+def test_user_pending_limit(queue):
+    queue.submit("alice", {})
+    queue.submit("alice", {})
+    with pytest.raises(UserLimitReached):
+        queue.submit("alice", {})
+    # other users are not affected
+    queue.submit("bob", {})
+
+
+def test_running_jobs_count_as_pending(queue):
+    first = queue.submit("alice", {})
+    queue.submit("alice", {})
+    assert queue.claim("w1").id == first
+    with pytest.raises(UserLimitReached):
+        queue.submit("alice", {})
+    queue.complete(first, "w1", {})
+    queue.submit("alice", {})
+
+
+def test_queue_full(queue):
+    queue.submit("alice", {})
+    queue.submit("bob", {})
+    queue.submit("carol", {})
+    with pytest.raises(QueueFull):
+        queue.submit("dave", {})
+
+
+def test_running_jobs_do_not_fill_the_queue(queue):
+    for user in ("alice", "bob", "carol"):
+        queue.submit(user, {})
+    assert queue.claim("w1") is not None
+    queue.submit("dave", {})
+
+
+# --------------------------------------------------
+# Claim
+# --------------------------------------------------
+
+def test_claim_is_fifo_and_marks_running(queue):
+    first = queue.submit("alice", {"n": 1})
+    queue.submit("bob", {"n": 2})
+    job = queue.claim("w1")
+    assert job.id == first
+    assert job.status == "running"
+    assert job.attempts == 1
+    assert job.payload == {"n": 1}
+
+
+def test_claim_skips_users_at_their_concurrency_limit(queue):
+    a1 = queue.submit("alice", {})
+    a2 = queue.submit("alice", {})
+    b1 = queue.submit("bob", {})
+
+    assert queue.claim("w1").id == a1
+    # alice already has a job running: bob's later job goes first
+    assert queue.claim("w2").id == b1
+    assert queue.claim("w3") is None
+
+    queue.complete(a1, "w1", {})
+    assert queue.claim("w3").id == a2
+
+
+def test_queue_position(queue):
+    a = queue.submit("alice", {})
+    b = queue.submit("bob", {})
+    assert queue.get(a).position == 1
+    assert queue.get(b).position == 2
+    queue.claim("w1")
+    assert queue.get(a).position == 0
+    assert queue.get(b).position == 1
+
+
+# --------------------------------------------------
+# Stale jobs
+# --------------------------------------------------
+
+def test_stale_job_is_requeued(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 2)
+    job_id = queue.submit("alice", {})
+    queue.claim("w1")
+    queue.set_progress(job_id, "w1", {"report": "partial"})
+    age_heartbeat(queue, job_id, job_queue.JOB_STALE_SECONDS + 1)
+
+    job = queue.claim("w2")
+    assert job.id == job_id
+    assert job.attempts == 2
+    assert job.progress == {}
+
+
+def test_fresh_heartbeat_keeps_the_job(queue):
+    job_id = queue.submit("alice", {})
+    queue.claim("w1")
+    age_heartbeat(queue, job_id, job_queue.JOB_STALE_SECONDS + 1)
+    assert queue.heartbeat(job_id, "w1")
+    assert queue.claim("w2") is None
+    assert queue.get(job_id).status == "running"
+
+
+def test_stale_job_fails_after_max_attempts(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 1)
+    job_id = queue.submit("alice", {})
+    queue.claim("w1")
+    age_heartbeat(queue, job_id, job_queue.JOB_STALE_SECONDS + 1)
+
+    assert queue.claim("w2") is None
+    job = queue.get(job_id)
+    assert job.status == "error"
+    assert "too many attempts" in job.error
+
+
+# --------------------------------------------------
+# Worker ownership
+# --------------------------------------------------
+
+def test_only_the_claiming_worker_can_update(queue):
+    job_id = queue.submit("alice", {})
+    queue.claim("w1")
+
+    assert not queue.heartbeat(job_id, "w2")
+    assert not queue.set_progress(job_id, "w2", {"report": "x"})
+    assert not queue.complete(job_id, "w2", {"decision": "x"})
+    assert not queue.fail(job_id, "w2", "boom")
+    assert queue.get(job_id).status == "running"
+
+    assert queue.complete(job_id, "w1", {"decision": "Violation"})
+    job = queue.get(job_id)
+    assert job.status == "done"
+    assert job.result == {"decision": "Violation"}
+
+
+def test_lost_worker_cannot_finish_a_requeued_job(queue):
+    job_id = queue.submit("alice", {})
+    queue.claim("w1")
+    age_heartbeat(queue, job_id, job_queue.JOB_STALE_SECONDS + 1)
+    assert queue.claim("w2").id == job_id
+
+    # w1 comes back after its job was handed to w2
+    assert not queue.complete(job_id, "w1", {"decision": "stale"})
+    assert queue.complete(job_id, "w2", {"decision": "fresh"})
+    assert queue.get(job_id).result == {"decision": "fresh"}
+
+
+def test_finished_job_cannot_be_updated(queue):
+    job_id = queue.submit("alice", {})
+    queue.claim("w1")
+    queue.fail(job_id, "w1", "boom")
+    assert not queue.complete(job_id, "w1", {})
+    assert queue.get(job_id).error == "boom"
+
+
+def test_release_requeues_without_using_an_attempt(queue):
+    job_id = queue.submit("alice", {})
+    queue.claim("w1")
+    assert queue.release(job_id, "w1")
+    job = queue.get(job_id)
+    assert job.status == "queued"
+    assert job.attempts == 0
+    assert not queue.release(job_id, "w1")
+
+
+def test_cancel_stops_the_worker_from_finishing(queue):
+    job_id = queue.submit("alice", {})
+    queue.claim("w1")
+    assert queue.cancel(job_id, "No analysis workers are running.")
+    assert not queue.complete(job_id, "w1", {})
+    assert queue.get(job_id).status == "error"
+
+
+def test_worker_reports(queue):
+    assert queue.workers_alive() == 0
+    queue.report_worker("w1", {"stage_count": {"job": 1}})
+    queue.report_worker("w1")   # liveness only: keeps the last snapshot
+    assert queue.workers_alive() == 1
+    assert queue.worker_metrics() == [{"stage_count": {"job": 1}}]
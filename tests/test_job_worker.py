@@ -0,0 +1,60 @@
+import os
+import sys
+import glob
+import time
+import subprocess
+
+import pytest
+from PyPDF2 import PdfReader
+
+from agent.job_queue import JobQueue
+from agent.pdf_extract import PARALLEL_PAGE_THRESHOLD
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def long_pdf() -> str:
+    # a real policy manual long enough for parallel page extraction
+    for path in sorted(glob.glob(os.path.join(REPO, "uploads", "*.pdf"))):
+        if len(PdfReader(path).pages) >= PARALLEL_PAGE_THRESHOLD:
+            return path
+    pytest.skip(f"no PDF with {PARALLEL_PAGE_THRESHOLD}+ pages in uploads/")
+
+
+def test_pool_runs_a_job_on_a_long_pdf(tmp_path):
+    # pool workers extract large PDFs in their own process pool
+    pdf = long_pdf()
+    queue = JobQueue(str(tmp_path / "cache" / "jobs.sqlite"))
+    job_id = queue.submit("alice", {
+        "policy_paths": [pdf],
+        "policy_names": [os.path.basename(pdf)],
+        "policy_hashes": [None],
+        "incident_path": pdf,
+        "incident_hash": None,
+    })
+
+    env = dict(
+        os.environ,
+        PYTHONPATH=REPO,
+        MODEL_BACKEND="offline",
+        SEGMENTER_MODE="regex",
+        TRACE_JSON_LOGS="0",
+        PDF_WORKERS="2",
+    )
+    pool = subprocess.Popen(
+        [sys.executable, "-m", "agent.job_worker", "--workers", "1"],
+        cwd=tmp_path, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    try:
+        deadline = time.time() + 180
+        job = queue.get(job_id)
+        while job.status in ("queued", "running") and time.time() < deadline:
+            time.sleep(0.5)
+            job = queue.get(job_id)
+    finally:
+        pool.terminate()
+        output = pool.communicate(timeout=30)[0]
+
+    assert job.status == "done", f"{job.status}: {job.error}\n{output[-2000:]}"
+    assert job.result["top_chunks"]
@@ -0,0 +1,33 @@
+from agent.embedding_store import LEXICAL_PREFILTER_MIN
+from agent.lexical_index import build_bm25_index
+
+# equal-length chunks (6 indexed terms each): no length normalization effects
+CHUNKS = [
+    "custodian disclosure consent patient record breach",
+    "custodian disclosure retention schedule archived paper",
+    "training records staff members yearly review",
+    "visitor badges issued reception desk daily",
+    "parking permits renewed every year online",
+    "cleaning rota kitchen floors weekly inspection",
+]
+QUERY = "custodian disclosure consent patient record breach"
+
+
+def test_partial_match_stays_below_the_prefilter_threshold():
+    index = build_bm25_index(CHUNKS)
+    hits = dict((text, score) for score, text in index.search([QUERY], k=6)[0])
+
+    full, partial = hits[CHUNKS[0]], hits[CHUNKS[1]]
+    assert partial < full
+    # 2 of 6 query terms must not skip the vector search
+    assert partial < LEXICAL_PREFILTER_MIN <= full
+
+
+def test_scores_are_not_capped():
+    repeated = "custodian disclosure " * 3
+    index = build_bm25_index(CHUNKS + [repeated])
+    hits = index.search(["custodian disclosure"], k=7)[0]
+    assert all(0 < score < 1 for score, _ in hits)
+    # more occurrences still rank higher instead of tying at a cap
+    assert hits[0][1] == repeated
+    assert hits[0][0] > hits[1][0]
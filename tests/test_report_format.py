@@ -0,0 +1,55 @@
+from agent.report_format import group_violations_locally, parse_report, render_report
+
+WRAPPED = """Decision: Violation
+
+A) Unauthorized disclosure of personal
+   health information
+- Evidence:
+  - [Chunk 3] "A custodian shall not disclose personal health information
+    without the individual's consent."
+- Children:
+  - A1) Incident fact: "The nurse shared the chart."
+       Why: The chart was disclosed to a visitor
+       without the patient's consent.
+  - A2) Incident fact: "The visitor photographed the chart."
+       Why: A further disclosure.
+
+B) Failure to notify
+- Evidence:
+  - [Chunk 5] "The custodian shall notify the individual."
+- Children:
+  - B1) Incident fact: "The patient was not told."
+       Why: No notification was given.
+
+Unmapped incident actions:
+- "The visitor left the ward." Not enough policy evidence.
+"""
+
+
+def test_wrapped_lines_stay_in_their_parent():
+    report = parse_report(WRAPPED)
+    first, second = report.parents
+
+    assert first.title == "Unauthorized disclosure of personal health information"
+    assert first.evidence[0].chunk == 3
+    assert first.evidence[0].quote.endswith("without the individual's consent.\"")
+    assert [c.fact for c in first.children] == [
+        '"The nurse shared the chart."',
+        '"The visitor photographed the chart."',
+    ]
+    assert first.children[0].why == (
+        "The chart was disclosed to a visitor without the patient's consent."
+    )
+    assert [c.fact for c in second.children] == ['"The patient was not told."']
+    assert report.trailing == [
+        "Unmapped incident actions:",
+        '- "The visitor left the ward." Not enough policy evidence.',
+    ]
+
+
+def test_wrapped_report_regroups_without_moving_children():
+    text = group_violations_locally(WRAPPED)
+    assert text.count("A2)") == 1
+    assert "A3)" not in text
+    assert text.index("A2) Incident fact") < text.index("B) Failure to notify")
+    assert render_report(parse_report(text)) == text